@@ -30,6 +30,37 @@ function getAudioFilePath(lazerDir, hash) {
     return path.join(lazerDir, 'files', firstChar, firstTwo);
 }
 
+// List each files/<x>/<xy> shard once and answer existence checks from memory
+function createFileStore(lazerDir) {
+    const shards = new Map();
+
+    return {
+        has(hash) {
+            const shardDir = getAudioFilePath(lazerDir, hash);
+            if (!shardDir) return false;
+
+            let names = shards.get(shardDir);
+            if (!names) {
+                try {
+                    names = new Set(fs.readdirSync(shardDir));
+                } catch (e) {
+                    names = new Set();
+                }
+                shards.set(shardDir, names);
+            }
+            return names.has(hash);
+        },
+        get shardCount() {
+            return shards.size;
+        }
+    };
+}
+
+// Progress goes to stdout on its own tagged lines so the caller can tell it apart from logs
+function reportProgress(done, total) {
+    process.stdout.write(`[Progress] ${done}/${total}\n`);
+}
+
 async function extractBeatmapData(lazerDir) {
     const realmPath = path.join(lazerDir, 'client.realm');
 
@@ -45,67 +76,114 @@ async function extractBeatmapData(lazerDir) {
             readOnly: true,
         });
 
-        const beatmaps = realm.objects('Beatmap');
+        const beatmapSets = realm.objects('BeatmapSet');
+        const fileStore = createFileStore(lazerDir);
         const results = [];
 
-        console.log(`[Found] ${beatmaps.length} beatmaps`);
-        const beatmapArray = Array.from({ length: beatmaps.length }, (_, i) => beatmaps[i]);
+        const totalBeatmaps = realm.objects('Beatmap').length;
+        const progressStep = Math.max(1, Math.floor(totalBeatmaps / 100));
+        let processedBeatmaps = 0;
+        let nextProgress = 0;
 
-        for (const beatmap of beatmapArray) {
+        console.log(`[Found] ${beatmapSets.length} beatmap sets, ${totalBeatmaps} beatmaps`);
+        reportProgress(0, totalBeatmaps);
+
+        for (const beatmapSet of beatmapSets) {
             try {
-                const difficultyName = beatmap.DifficultyName;
-                const metadata = beatmap.Metadata;
-                if (!metadata) continue;
-                const title = String(metadata.Title || metadata.TitleUnicode || 'Unknown');
-                const artist = String(metadata.Artist || metadata.ArtistUnicode || 'Unknown');
-                const mapper = String(metadata.Author?.Username || 'Unknown');
-                const audioFilename = String(metadata.AudioFile || '');
-                const backgroundFilename = String(metadata.BackgroundFile || '');
-
-                const beatmapSet = beatmap.BeatmapSet;
-                if (!beatmapSet) continue;
-                let audioHash = null;
-                let backgroundHash = null;
+                if (beatmapSet.DeletePending) continue;
 
+                // Filename -> hash lookup, built once per set instead of once per difficulty
+                const fileHashes = new Map();
                 try {
                     if (beatmapSet.Files) {
-                        for (let j = 0; j < beatmapSet.Files.length; j++) {
-                            const f = beatmapSet.Files[j];
+                        for (const f of beatmapSet.Files) {
                             if (f.File && f.File.Hash) {
-                                if (f.Filename === audioFilename) audioHash = String(f.File.Hash);
-                                if (f.Filename === backgroundFilename) backgroundHash = String(f.File.Hash);
+                                fileHashes.set(f.Filename, String(f.File.Hash));
                             }
                         }
                     }
                 } catch (fe) {}
 
-                const audioPath = audioHash ? getAudioFilePath(lazerDir, audioHash) : null;
-                const backgroundPath = backgroundHash ? getAudioFilePath(lazerDir, backgroundHash) : null;
-
-                results.push({
-                    title,
-                    artist,
-                    mapper,
-                    difficulty: difficultyName,
-                    audioFilename: audioFilename || 'Unknown',
-                    audioHash,
-                    audioPath,
-                    fileExists: audioPath ? fs.existsSync(audioPath) : false,
-                    backgroundFilename: backgroundFilename || null,
-                    backgroundHash,
-                    backgroundPath,
-                    backgroundExists: backgroundPath ? fs.existsSync(backgroundPath) : false
-                });
-
-            } catch (beatmapError) {
-                console.warn(`[Warning] Skipped beatmap: ${beatmapError.message}`);
+                // One record per distinct audio file in the set
+                const byAudio = new Map();
+
+                for (const beatmap of beatmapSet.Beatmaps || []) {
+                    processedBeatmaps++;
+                    if (processedBeatmaps >= nextProgress) {
+                        reportProgress(processedBeatmaps, totalBeatmaps);
+                        nextProgress = processedBeatmaps + progressStep;
+                    }
+
+                    try {
+                        const difficultyName = beatmap.DifficultyName;
+                        const metadata = beatmap.Metadata;
+                        if (!metadata) continue;
+                        const audioFilename = String(metadata.AudioFile || '');
+                        const audioHash = fileHashes.get(audioFilename) || null;
+                        const audioKey = audioHash || `missing:${audioFilename}`;
+
+                        const length = Math.round(Number(beatmap.Length) || 0);
+                        const existing = byAudio.get(audioKey);
+                        if (existing) {
+                            existing.difficulties.push(difficultyName);
+                            // Longest difficulty is the closest to the full track length
+                            if (length > existing.length) existing.length = length;
+                            continue;
+                        }
+
+                        const title = String(metadata.Title || metadata.TitleUnicode || 'Unknown');
+                        const artist = String(metadata.Artist || metadata.ArtistUnicode || 'Unknown');
+                        const mapper = String(metadata.Author?.Username || 'Unknown');
+                        const backgroundFilename = String(metadata.BackgroundFile || '');
+                        const backgroundHash = fileHashes.get(backgroundFilename) || null;
+
+                        const audioPath = audioHash ? getAudioFilePath(lazerDir, audioHash) : null;
+                        const backgroundPath = backgroundHash ? getAudioFilePath(lazerDir, backgroundHash) : null;
+
+                        byAudio.set(audioKey, {
+                            title,
+                            artist,
+                            titleUnicode: String(metadata.TitleUnicode || ''),
+                            artistUnicode: String(metadata.ArtistUnicode || ''),
+                            source: String(metadata.Source || ''),
+                            tags: String(metadata.Tags || ''),
+                            mapper,
+                            difficulty: difficultyName,
+                            difficulties: [difficultyName],
+                            length,
+                            bpm: Number(beatmap.BPM) || 0,
+                            beatmapId: Number(beatmap.OnlineID ?? -1),
+                            beatmapSetId: Number(beatmapSet.OnlineID ?? -1),
+                            audioFilename: audioFilename || 'Unknown',
+                            audioHash,
+                            audioPath,
+                            fileExists: audioHash ? fileStore.has(audioHash) : false,
+                            backgroundFilename: backgroundFilename || null,
+                            backgroundHash,
+                            backgroundPath,
+                            backgroundExists: backgroundHash ? fileStore.has(backgroundHash) : false
+                        });
+
+                    } catch (beatmapError) {
+                        console.warn(`[Warning] Skipped beatmap: ${beatmapError.message}`);
+                        continue;
+                    }
+                }
+
+                for (const record of byAudio.values()) {
+                    results.push(record);
+                }
+
+            } catch (setError) {
+                console.warn(`[Warning] Skipped beatmap set: ${setError.message}`);
                 continue;
             }
         }
 
+        reportProgress(totalBeatmaps, totalBeatmaps);
         realm.close();
         const detached = JSON.parse(JSON.stringify(results));
-        console.log(`[Processed] ${results.length} beatmaps`);
+        console.log(`[Processed] ${results.length} audio files (${fileStore.shardCount} shard directories listed)`);
         return detached;
 
     } catch (error) {
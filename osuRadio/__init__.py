@@ -5,7 +5,8 @@ __author__ = "Paraliyzed_evo"
 from osuRadio.audio import PitchAdjustedPlayer, get_audio_duration, PlayerMixin, _log_ffmpeg_info
 
 # Database
-from osuRadio.db import load_cache, save_cache, get_audio_path, remove_missing_songs, validate_cache, update_folder_mtime
+from osuRadio.db import LibraryStore, library_store, play_recorder, get_most_played, get_recently_played, save_playlist, load_playlist, list_playlists, delete_playlist, load_cache, load_library, save_cache, reconcile_cache, sync_lazer_cache, search_songs, get_audio_path, remove_missing_songs, validate_cache, update_folder_mtime
+from osuRadio.merge import merge_library, split_by_source, song_identity
 from osuRadio.lazer import compute_file_hash, run_lazer_reader, convert_lazer_to_songs, LazerScanner
 
 # Settings & UI
@@ -19,13 +20,14 @@ from osuRadio.msg import show_modal
 
 # Features
 from osuRadio.custom_songs import CustomSongsMixin
-from osuRadio.scanner import LibraryScanner, LibraryMixin
+from osuRadio.scanner import LibraryScanner, LibraryLoadWorker, LibraryCheckWorker, LibraryMixin
+from osuRadio.snapshot import read_snapshot, write_snapshot, snapshot_rows
 from osuRadio.context_menu import ContextMenuMixin
 
 # Config
 from osuRadio.config import (
     BASE_PATH, DATABASE_FILE, SETTINGS_FILE, CUSTOM_SONGS_PATH,
-    EXPORT_STATE_FILE, ICON_PATH, IMG_PATH, get_yt_dlp_path, IS_WINDOWS,
+    EXPORT_STATE_FILE, SNAPSHOT_FILE, ICON_PATH, IMG_PATH, get_yt_dlp_path, IS_WINDOWS,
     get_lazer_reader_path, get_silent_subprocess_kwargs
 )
 
@@ -37,7 +39,8 @@ __all__ = [
     "PitchAdjustedPlayer", "get_audio_duration", "PlayerMixin", "_log_ffmpeg_info",
 
     # Database
-    "load_cache", "save_cache", "get_audio_path", "remove_missing_songs", "validate_cache", "update_folder_mtime",
+    "LibraryStore", "library_store", "play_recorder", "get_most_played", "get_recently_played", "save_playlist", "load_playlist", "list_playlists", "delete_playlist", "load_cache", "load_library", "save_cache", "reconcile_cache", "sync_lazer_cache", "search_songs", "get_audio_path", "remove_missing_songs", "validate_cache", "update_folder_mtime",
+    "merge_library", "split_by_source", "song_identity",
 
     # Settings & UI
     "SettingsDialog", "SettingsMixin", "MarqueeLabel", "BackgroundWidget", "UiMixin",
@@ -46,11 +49,12 @@ __all__ = [
     "check_for_update", "download_and_install_update", "UpdateMixin", "update_media_key_listener", "show_modal",
 
     # Features
-    "CustomSongsMixin", "LibraryScanner", "LibraryMixin", "ContextMenuMixin",
+    "CustomSongsMixin", "LibraryScanner", "LibraryLoadWorker", "LibraryCheckWorker", "LibraryMixin",
+    "read_snapshot", "write_snapshot", "snapshot_rows", "ContextMenuMixin",
 
     # Config
     "BASE_PATH", "DATABASE_FILE", "SETTINGS_FILE", "CUSTOM_SONGS_PATH",
-    "EXPORT_STATE_FILE", "ICON_PATH", "IMG_PATH", "get_yt_dlp_path", "IS_WINDOWS",
+    "EXPORT_STATE_FILE", "SNAPSHOT_FILE", "ICON_PATH", "IMG_PATH", "get_yt_dlp_path", "IS_WINDOWS",
     "get_lazer_reader_path", "LazerScanner", "compute_file_hash", "run_lazer_reader", 
     "convert_lazer_to_songs", "get_silent_subprocess_kwargs",
 
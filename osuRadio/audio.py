@@ -8,6 +8,7 @@ import tempfile
 import hashlib
 import random
 import platform
+import time
 from time import monotonic
 from pathlib import Path
 from PySide6.QtCore import (
@@ -20,7 +21,8 @@ from PySide6.QtGui import (
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput, QMediaDevices, QAudioFormat
 
 from osuRadio.config import get_ffmpeg_bin_path, DATABASE_FILE, get_silent_subprocess_kwargs
-from osuRadio.db import get_audio_path
+from osuRadio.db import get_audio_path, get_recently_played, play_recorder
+from osuRadio.merge import build_song_index, resolve_song
 
 def _run_ffmpeg_stream(stream_out):
     cmd = ffmpeg.compile(stream_out.overwrite_output())
@@ -129,7 +131,7 @@ class PitchAdjustedPlayer:
             print(f"[Duration Error] Could not get duration for {path}: {e}")
             return 0
 
-    def play(self, input_path: str, speed: float = 1.0, preserve_pitch: bool = True, start_ms: int = 0, force_play=False):
+    def play(self, input_path: str, speed: float = 1.0, preserve_pitch: bool = True, start_ms: int = 0, force_play=False, duration_hint_ms: int = 0):
         if (
             self._last_path == input_path
             and abs(self.playback_rate - speed) < 0.01
@@ -169,7 +171,8 @@ class PitchAdjustedPlayer:
             self._pending_play = True
         else:
             file_url = QUrl.fromLocalFile(str(input_path))
-            original_duration = self._get_wav_duration_ms(str(input_path))
+            # A known length skips the ffmpeg probe, Qt's own duration replaces it once loaded
+            original_duration = duration_hint_ms or self._get_wav_duration_ms(str(input_path))
             self.last_duration = int(original_duration / speed)
             self.player.setSource(QUrl())
             self.player.setSource(file_url)
@@ -399,6 +402,12 @@ class PlayerMixin:
         if player.playbackState() != QMediaPlayer.PlayingState:
             return
 
+        # Duration may have been refined from the loaded media (see duration_hint_ms)
+        if self.pitch_player.last_duration and self.pitch_player.last_duration != self.current_duration:
+            self.current_duration = self.pitch_player.last_duration
+            self.slider.setRange(0, self.current_duration)
+            self.total_label.setText(self.format_time(self.current_duration))
+
         if self.preserve_pitch:
             elapsed_ms = player.position()
         else:
@@ -434,11 +443,17 @@ class PlayerMixin:
             player.pause()
             self.playback_timer.stop()
             self.is_playing = False
+            self._stop_listening()
+        elif getattr(self, "_resume_position_ms", None) is not None:
+            # Nothing loaded yet, pick up where the last session stopped
+            self._resume_playback()
+            return
         else:
             player.play()
             if not self.playback_timer.isActive():
                 self.playback_timer.start()
             self.is_playing = True
+            self._start_listening()
 
         self.update_play_pause_icon()
 
@@ -446,12 +461,37 @@ class PlayerMixin:
         self.pitch_player.player.pause()
         self.playback_timer.stop()
         self.is_playing = False
+        self._stop_listening()
         self.update_play_pause_icon()
 
+    def _start_listening(self):
+        if getattr(self, "_listening_since", None) is None:
+            self._listening_since = monotonic()
+
+    def _stop_listening(self):
+        # Listened time only grows while playing, so seeking ahead or pausing does not count
+        since = getattr(self, "_listening_since", None)
+        if since is not None:
+            self._listened_ms = getattr(self, "_listened_ms", 0) + int((monotonic() - since) * 1000)
+            self._listening_since = None
+
+    def _finish_play(self):
+        # Hands the play that is ending to the recorder, which buffers it in memory
+        play = getattr(self, "_current_play", None)
+        if play is None:
+            return
+        self._current_play = None
+        self._stop_listening()
+        song, started_at, speed = play
+        listened_ms = min(self._listened_ms, self.current_duration) if self.current_duration else self._listened_ms
+        play_recorder.record(song, started_at, listened_ms, self.current_duration, speed)
+
     def play_song_at_index(self, index):
         if index >= len(self.queue):
             return
 
+        self._finish_play()
+        self._resume_position_ms = None
         self.current_index = index
         song = self.queue[index]
         path = get_audio_path(song)
@@ -468,11 +508,15 @@ class PlayerMixin:
             str(path),
             speed=speed,
             preserve_pitch=self.preserve_pitch,
-            force_play=True
+            force_play=True,
+            duration_hint_ms=int(song.get("length") or 0)
         )
 
         self.current_duration = self.pitch_player.last_duration
         self._playback_start_time = monotonic()
+        self._current_play = (song, time.time(), speed)
+        self._listened_ms = 0
+        self._listening_since = monotonic()
         self.slider.setRange(0, self.current_duration)
         self.slider.setValue(0)
         self.elapsed_label.setText("0:00")
@@ -486,6 +530,12 @@ class PlayerMixin:
         self.is_playing = True
         self.update_play_pause_icon()
 
+    def _resume_playback(self):
+        position_ms = getattr(self, "_resume_position_ms", None)
+        self.play_song_at_index(self.current_index if self.current_index < len(self.queue) else 0)
+        if position_ms:
+            QTimer.singleShot(300, lambda: self.seek(position_ms))
+
     def next_song(self):
         if self.loop_mode == 2:  # Loop single
             QTimer.singleShot(0, lambda: self.play_song_at_index(self.current_index))
@@ -504,6 +554,11 @@ class PlayerMixin:
 
     def shuffle(self):
         random.shuffle(self.queue)
+        # Songs heard recently go to the back so a fresh shuffle does not repeat them
+        index = build_song_index(self.queue)
+        recent = {id(song) for song in (resolve_song(index, row) for row in get_recently_played(50)) if song}
+        if recent:
+            self.queue.sort(key=lambda s: id(s) in recent)
         self.populate_list(self.queue)
         self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
         self.song_list.setCurrentRow(self.current_index)
@@ -27,6 +27,7 @@ DATABASE_FILE      = BASE_PATH / "songs.db"
 SETTINGS_FILE      = BASE_PATH / "settings.json"
 CUSTOM_SONGS_PATH  = BASE_PATH / "custom_songs"
 EXPORT_STATE_FILE  = BASE_PATH / "export_selected.json"
+SNAPSHOT_FILE      = BASE_PATH / "library.snapshot"
 CUSTOM_SONGS_PATH.mkdir(exist_ok=True)
 
 # DPI awareness (Windows only)
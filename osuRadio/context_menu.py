@@ -2,17 +2,36 @@ from PySide6.QtCore import (
     Qt
 )
 from PySide6.QtWidgets import (
-    QMenu
+    QMenu, QInputDialog
 )
+from osuRadio.db import (
+    get_most_played, get_recently_played, list_playlists, load_playlist, save_playlist, delete_playlist
+)
+from osuRadio.merge import resolve_song
 
 class ContextMenuMixin:
     def onSongContextMenu(self, point):
         item = self.song_list.itemAt(point)
-        if not item:
-            return
         menu = QMenu(self)
-        action = menu.addAction("Add to Next ▶")
-        action.triggered.connect(lambda: self.addToNext(item))
+        if item:
+            action = menu.addAction("Add to Next ▶")
+            action.triggered.connect(lambda: self.addToNext(item))
+            menu.addSeparator()
+        menu.addAction("Most Played").triggered.connect(lambda: self.showPlayHistory(get_most_played))
+        menu.addAction("Recently Played").triggered.connect(lambda: self.showPlayHistory(get_recently_played))
+        menu.addAction("Show Queue").triggered.connect(lambda: self.populate_list(self.queue))
+        menu.addSeparator()
+        playlists = list_playlists()
+        if playlists:
+            load_menu = menu.addMenu("Playlists")
+            delete_menu = menu.addMenu("Delete Playlist")
+            for playlist in playlists:
+                name = playlist["name"]
+                load_menu.addAction(f"{name} ({playlist['count']})").triggered.connect(
+                    lambda _=False, n=name: self.loadPlaylist(n)
+                )
+                delete_menu.addAction(name).triggered.connect(lambda _=False, n=name: delete_playlist(n))
+        menu.addAction("Save Queue as Playlist…").triggered.connect(self.saveQueueAsPlaylist)
         menu.exec(self.song_list.mapToGlobal(point))
 
     def addToNext(self, item):
@@ -25,4 +44,32 @@ class ContextMenuMixin:
         self.queue.insert(insert_index, song)
 
         self.populate_list(self.queue)
-        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
\ No newline at end of file
+        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+
+    def saveQueueAsPlaylist(self):
+        name, ok = QInputDialog.getText(self, "Save Playlist", "Playlist name:")
+        name = name.strip()
+        if ok and name:
+            song_ids, index, _ = self._queue_state()
+            save_playlist(name, song_ids, index)
+
+    def loadPlaylist(self, name):
+        # The playlist's songs go to the front of the queue and play from its saved index
+        saved = load_playlist(name)
+        if not saved:
+            return
+        song_ids, index, _ = saved
+        self._apply_saved_queue(song_ids, index)
+        self.populate_list(self.queue)
+        self.play_song_at_index(self.current_index)
+
+    def showPlayHistory(self, fetch):
+        # Play stats are stored per (title, artist), map them back onto library entries
+        index = self._library_by_identity()
+        songs, seen = [], set()
+        for row in fetch():
+            song = resolve_song(index, row)
+            if song is not None and id(song) not in seen:
+                seen.add(id(song))
+                songs.append(song)
+        self.populate_list(songs)
@@ -4,7 +4,6 @@ import sys
 import os
 import json
 import zipfile
-import sqlite3
 import py7zr
 from pathlib import Path
 
@@ -16,10 +15,10 @@ from PySide6.QtWidgets import (
 )
 
 from osuRadio.audio import get_audio_duration
-from osuRadio.db import save_cache
+from osuRadio.db import save_cache, load_cache, set_metadata, get_song_keys, init_db, library_store
 from osuRadio.msg import show_modal
 from osuRadio.config import (
-    CUSTOM_SONGS_PATH, DATABASE_FILE, IS_WINDOWS, get_yt_dlp_path,
+    CUSTOM_SONGS_PATH, IS_WINDOWS, get_yt_dlp_path,
     BASE_PATH, EXPORT_STATE_FILE
 )
 
@@ -82,38 +81,14 @@ class CustomSongsMixin:
             self.export_songs_dialog()
 
     def import_custom_audio(self, folder: Path):
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS songs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT,
-                    artist TEXT,
-                    mapper TEXT,
-                    audio TEXT,
-                    background TEXT,
-                    length INTEGER,
-                    osu_file TEXT,
-                    folder TEXT
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS metadata (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-            """)
-            conn.commit()
+        init_db()
 
         print(f"[Custom Audio] Importing from: {folder}")
         supported_exts = {".mp3", ".wav", ".ogg", ".flac", ".m4a", ".opus"}
         maps = []
 
         # existing rows for this folder
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT title, artist, audio FROM songs WHERE folder = ?", (str(folder),))
-            existing = set((r[0], r[1], r[2]) for r in cursor.fetchall())
+        existing = get_song_keys(folder)
 
         for file in folder.glob("*"):
             if file.suffix.lower() in supported_exts:
@@ -141,27 +116,31 @@ class CustomSongsMixin:
                 except Exception as e:
                     print(f"[Custom Audio] Failed to import {file}: {e}")
 
+        written = None
         if maps:
-            save_cache(str(folder), maps)
+            written = save_cache(str(folder), maps)
             try:
-                mtime = str(os.path.getmtime(self.osu_folder))
-                with sqlite3.connect(DATABASE_FILE) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
-                        ("folder_mtime", mtime)
-                    )
-                    conn.commit()
+                set_metadata("folder_mtime", str(os.path.getmtime(self.osu_folder)))
             except Exception as e:
                 print(f"[Custom Audio] Failed to update folder_mtime: {e}")
 
-            self.library.extend(maps)
-            self.queue.extend(maps)
-            self.populate_list(self.queue)
-            self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-            QMessageBox.information(self, "Import Complete", f"Imported {len(maps)} custom songs.")
+            self._when_written(written, lambda _: self._add_imported_songs(folder, maps))
         else:
             QMessageBox.warning(self, "No Songs Found", "No supported audio files found.")
+        return written
+
+    def _add_imported_songs(self, folder, maps):
+        # Read back from songs.db so the new songs carry their row ids
+        imported = {(m["title"], m["artist"], m["audio"]) for m in maps}
+        added = [
+            s for s in load_cache(folder) or []
+            if (s.get("title"), s.get("artist"), s.get("audio")) in imported
+        ]
+        self._replace_library(self.library + added)
+        self.queue.extend(added)
+        self.populate_list(self.queue)
+        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+        QMessageBox.information(self, "Import Complete", f"Imported {len(added)} custom songs.")
 
         if self.current_index >= len(self.queue):
             self.current_index = 0
@@ -468,9 +447,9 @@ class CustomSongsMixin:
             print(f"[Export] Failed to load previous selection: {e}")
 
         # Get songs from database
-        with sqlite3.connect(DATABASE_FILE) as conn:
+        with library_store.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT title, artist, audio, folder FROM songs")
+            cursor.execute("SELECT title, artist, audio, folder FROM songs WHERE missing_since IS NULL")
             rows = cursor.fetchall()
             songs = [{"title": r[0], "artist": r[1], "audio": r[2], "folder": r[3]} for r in rows]
 
@@ -1,51 +1,574 @@
 import os
+import re
+import json
 import sqlite3
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
 import tempfile
 from typing import List, Dict, Tuple, Optional
 from osuRadio.config import DATABASE_FILE
+from osuRadio.merge import merge_library
+
+class DatabaseWriter:
+    # The only connection that writes. Operations are queued from any thread and run on
+    # one writer thread; whatever is waiting when it wakes up shares one transaction,
+    # with a savepoint per operation so a failing one does not take the others with it.
+    # An operation is op(cursor, *args) and must not commit. Operations submitted with
+    # transaction=False (VACUUM, checkpoints) run on their own in autocommit mode.
+    MAX_BATCH = 64
+
+    def __init__(self, store: "LibraryStore"):
+        self.store = store
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, op, *args, transaction: bool = True) -> Future:
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="DatabaseWriter", daemon=True)
+                self._thread.start()
+            self._queue.put((op, args, future, transaction))
+        return future
+
+    def stop(self, timeout: float = 10):
+        # Pending operations are still written before the thread exits
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        try:
+            conn = self.store.connection()
+            conn.isolation_level = None
+        except Exception as e:
+            print(f"[DatabaseWriter] Could not open {self.store.path}: {e}")
+            with self._lock:
+                self._thread = None
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not None:
+                        item[2].set_exception(e)
+            return
+        held = []
+        try:
+            while True:
+                item = held.pop() if held else self._queue.get()
+                if item is None:
+                    return
+                if not item[3]:
+                    self._run_alone(conn, item)
+                    continue
+                batch = [item]
+                while len(batch) < self.MAX_BATCH:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None or not item[3]:
+                        held.append(item)
+                        break
+                    batch.append(item)
+                self._run_batch(conn, batch)
+        finally:
+            self.store.close()
+
+    def _run_alone(self, conn, item):
+        op, args, future, _ = item
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(op(conn.cursor(), *args))
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            future.set_exception(e)
+
+    def _run_batch(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, args, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((future, op(conn.cursor(), *args), None))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"[DatabaseWriter] Transaction failed: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+class LibraryStore:
+    # One long-lived connection per thread. WAL lets the GUI thread read while a
+    # scanner thread writes, and a persistent connection keeps sqlite3's statement cache warm.
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-32000",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA foreign_keys=ON",
+    )
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._migration_lock = threading.Lock()
+        self._migration_thread = None
+        self._migrated = threading.Event()
+        self.writer = DatabaseWriter(self)
+
+    def connection(self) -> sqlite3.Connection:
+        # Every caller sees the current schema: the first use waits for the startup migration
+        if not self._migrated.is_set():
+            self.ensure_schema()
+        return self._thread_connection()
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            new_file = not self.path.exists() or self.path.stat().st_size == 0
+            conn = sqlite3.connect(self.path, timeout=10, cached_statements=256)
+            if new_file:
+                # Only takes effect before WAL writes the file header, after that it
+                # needs a full VACUUM to change
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    def start_migrations(self):
+        # Called once at startup so migrations overlap building the window
+        with self._migration_lock:
+            if self._migration_thread is None and not self._migrated.is_set():
+                self._migration_thread = threading.Thread(
+                    target=self._run_migrations, name="SchemaMigrations", daemon=True
+                )
+                self._migration_thread.start()
+
+    def _run_migrations(self):
+        try:
+            migrate(self._thread_connection())
+        except Exception as e:
+            print(f"[LibraryStore] Migration failed: {e}")
+        finally:
+            self.close()
+            self._migrated.set()
+
+    def ensure_schema(self):
+        # Only waits for the startup migration, no DDL runs here
+        if not self._migrated.is_set():
+            self.start_migrations()
+            self._migrated.wait()
+
+    def write(self, op, *args, transaction: bool = True) -> Future:
+        return self.writer.submit(op, *args, transaction=transaction)
+
+    def close(self):
+        # Worker threads call this before exiting so their connection does not outlive them
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+library_store = LibraryStore(DATABASE_FILE)
+
+def _log_write_errors(future: Future, tag: str, detail: str = ""):
+    # Done-callback for writes nobody waits on: failures are printed, success is silent
+    if future.exception():
+        print(f"[{tag}] Error{' ' + detail if detail else ''}: {future.exception()}")
+
+def releases_connection(run):
+    # For QThread.run: drop the worker thread's connection once the thread is done with it
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return run(self, *args, **kwargs)
+        finally:
+            library_store.close()
+    return wrapper
 
 def init_db():
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS songs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                artist TEXT,
-                mapper TEXT,
-                audio TEXT,
-                background TEXT,
-                background_hash TEXT,
-                length INTEGER,
-                osu_file TEXT,
-                folder TEXT,
-                source_folder TEXT,
-                source TEXT DEFAULT 'stable',
-                audio_hash TEXT,
-                UNIQUE(title, artist, mapper, source_folder)
-            )""")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS metadata (
-                key TEXT PRIMARY KEY,
-                value TEXT
+    library_store.ensure_schema()
+
+def _columns(cursor, table: str) -> set:
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+
+SONGS_TABLE = """
+    CREATE TABLE songs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        artist TEXT,
+        mapper TEXT,
+        audio TEXT,
+        background TEXT,
+        background_hash TEXT,
+        length INTEGER,
+        osu_file TEXT,
+        folder TEXT,
+        source_folder TEXT,
+        source TEXT DEFAULT 'stable',
+        audio_hash TEXT,
+        bpm REAL,
+        beatmap_id INTEGER,
+        beatmapset_id INTEGER,
+        dup_cluster INTEGER,
+        track_id INTEGER,
+        UNIQUE(title, artist, mapper, source_folder)
+    )"""
+
+def _migrate_v1(cursor):
+    # Brings any unversioned database to the first versioned schema. Older builds added
+    # columns ad hoc, and the custom songs import used to create its own songs table
+    # without source_folder or the unique key if it ran first.
+    tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "songs" in tables:
+        row = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'songs'").fetchone()
+        if "UNIQUE" not in (row[0] or "").upper():
+            legacy = _columns(cursor, "songs") - {"id"}
+            cursor.execute("ALTER TABLE songs RENAME TO songs_legacy")
+            cursor.execute(SONGS_TABLE)
+            columns = ", ".join(sorted(legacy - {"source_folder"}))
+            source_folder = "source_folder" if "source_folder" in legacy else "folder"
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO songs ({columns}, source_folder)
+                SELECT {columns}, {source_folder} FROM songs_legacy
+            """)
+            cursor.execute("DROP TABLE songs_legacy")
+        else:
+            existing = _columns(cursor, "songs")
+            for col, definition in [
+                ("source_folder", "TEXT"),
+                ("source", "TEXT DEFAULT 'stable'"),
+                ("audio_hash", "TEXT"),
+                ("background_hash", "TEXT"),
+                ("bpm", "REAL"),
+                ("beatmap_id", "INTEGER"),
+                ("beatmapset_id", "INTEGER"),
+                ("dup_cluster", "INTEGER"),
+                ("track_id", "INTEGER"),
+            ]:
+                if col not in existing:
+                    cursor.execute(f"ALTER TABLE songs ADD COLUMN {col} {definition}")
+    else:
+        cursor.execute(SONGS_TABLE)
+
+    # One track per distinct audio, every beatmap row using that audio points at it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            identity TEXT UNIQUE
+        )""")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )""")
+    # Content hashes survive rescans, a file is only hashed again if its size or mtime change
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            hash TEXT,
+            fingerprint TEXT
+        )""")
+    if "fingerprint" not in _columns(cursor, "file_hashes"):
+        cursor.execute("ALTER TABLE file_hashes ADD COLUMN fingerprint TEXT")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS acoustic_fingerprints (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            fingerprint BLOB
+        )""")
+
+    # Indexes for the lookup paths: per-folder loads, lazer-over-stable dedupe,
+    # hash and (folder, audio) updates from the backfill, and track membership
+    for name, definition in [
+        ("idx_songs_source_folder", "songs(source_folder)"),
+        ("idx_songs_title_artist_source", "songs(title, artist, source)"),
+        ("idx_songs_folder_audio", "songs(folder, audio)"),
+        ("idx_songs_audio_hash", "songs(audio_hash)"),
+        ("idx_songs_track_id", "songs(track_id)"),
+    ]:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+    _assign_tracks(cursor)
+
+def _migrate_v2(cursor):
+    # Rows whose file disappeared are tombstoned rather than deleted, so hashes and
+    # durations come back with the file. NULL means the song is present.
+    cursor.execute("ALTER TABLE songs ADD COLUMN missing_since INTEGER")
+
+# Columns the search box matches on, bm25 weights in the same order
+SEARCH_COLUMNS = (
+    ("title", 10.0), ("title_unicode", 10.0), ("artist", 8.0), ("artist_unicode", 8.0),
+    ("mapper", 3.0), ("map_source", 2.0), ("tags", 1.0), ("source", 1.0),
+)
+
+def _migrate_v3(cursor):
+    # Search metadata plus an external-content FTS5 index over it, kept in step by triggers
+    for col in ("title_unicode", "artist_unicode", "map_source", "tags"):
+        cursor.execute(f"ALTER TABLE songs ADD COLUMN {col} TEXT")
+    columns = ", ".join(c for c, _ in SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c, _ in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c, _ in SEARCH_COLUMNS)
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE songs_fts USING fts5(
+                {columns},
+                content='songs', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
             )""")
-        # Add new columns if they don't exist
-        for col, definition in [
-            ("source_folder", "TEXT"),
-            ("source", "TEXT DEFAULT 'stable'"),
-            ("audio_hash", "TEXT"),
-            ("background_hash", "TEXT"),
-        ]:
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5, search_songs falls back to in-memory matching
+        print(f"[migrate] Full-text search unavailable: {e}")
+        return
+    cursor.execute(f"""
+        CREATE TRIGGER songs_fts_insert AFTER INSERT ON songs BEGIN
+            INSERT INTO songs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END""")
+    cursor.execute(f"""
+        CREATE TRIGGER songs_fts_delete AFTER DELETE ON songs BEGIN
+            INSERT INTO songs_fts (songs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END""")
+    cursor.execute(f"""
+        CREATE TRIGGER songs_fts_update AFTER UPDATE OF {columns} ON songs BEGIN
+            INSERT INTO songs_fts (songs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO songs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END""")
+    cursor.execute("INSERT INTO songs_fts (songs_fts) VALUES ('rebuild')")
+
+def _migrate_v4(cursor):
+    # Play history. plays is append-only; play_stats is its running aggregate per
+    # (title, artist), kept current by a trigger instead of re-aggregating on read.
+    # The song columns of the latest play let the UI find the song in the library again.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plays (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            artist TEXT,
+            source TEXT,
+            folder TEXT,
+            audio TEXT,
+            audio_hash TEXT,
+            started_at INTEGER NOT NULL,
+            listened_ms INTEGER NOT NULL,
+            skipped INTEGER NOT NULL,
+            speed REAL NOT NULL
+        )""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plays_started_at ON plays(started_at)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS play_stats (
+            title_key TEXT NOT NULL,
+            artist_key TEXT NOT NULL,
+            title TEXT,
+            artist TEXT,
+            source TEXT,
+            folder TEXT,
+            audio TEXT,
+            audio_hash TEXT,
+            play_count INTEGER NOT NULL,
+            skip_count INTEGER NOT NULL,
+            listened_ms INTEGER NOT NULL,
+            last_played INTEGER NOT NULL,
+            PRIMARY KEY (title_key, artist_key)
+        ) WITHOUT ROWID""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_play_stats_count ON play_stats(play_count)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_play_stats_last_played ON play_stats(last_played)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS plays_stats AFTER INSERT ON plays BEGIN
+            INSERT INTO play_stats VALUES (
+                lower(trim(new.title)), lower(trim(new.artist)),
+                new.title, new.artist, new.source, new.folder, new.audio, new.audio_hash,
+                new.skipped = 0, new.skipped != 0, new.listened_ms, new.started_at
+            )
+            ON CONFLICT(title_key, artist_key) DO UPDATE SET
+                play_count = play_count + excluded.play_count,
+                skip_count = skip_count + excluded.skip_count,
+                listened_ms = listened_ms + excluded.listened_ms,
+                title = CASE WHEN excluded.last_played >= last_played THEN excluded.title ELSE title END,
+                artist = CASE WHEN excluded.last_played >= last_played THEN excluded.artist ELSE artist END,
+                source = CASE WHEN excluded.last_played >= last_played THEN excluded.source ELSE source END,
+                folder = CASE WHEN excluded.last_played >= last_played THEN excluded.folder ELSE folder END,
+                audio = CASE WHEN excluded.last_played >= last_played THEN excluded.audio ELSE audio END,
+                audio_hash = CASE WHEN excluded.last_played >= last_played THEN excluded.audio_hash ELSE audio_hash END,
+                last_played = max(last_played, excluded.last_played);
+        END""")
+
+def _migrate_v5(cursor):
+    # mtime of every set folder at index time: an unchanged folder still holds the
+    # files it held then, so validation can skip listing it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folder_mtimes (
+            folder TEXT PRIMARY KEY,
+            source_folder TEXT,
+            mtime_ns INTEGER NOT NULL
+        ) WITHOUT ROWID""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_folder_mtimes_source_folder ON folder_mtimes(source_folder)")
+
+def _migrate_v6(cursor):
+    # Ordered lists of song row ids. Row ids survive rescans (upserts keep them), so a
+    # playlist only loses a song when its row is purged. The session queue is stored as
+    # a playlist too, with where playback was.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS playlists (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            current_index INTEGER NOT NULL DEFAULT 0,
+            position_ms INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER NOT NULL
+        )""")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS playlist_items (
+            playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            song_id INTEGER NOT NULL,
+            PRIMARY KEY (playlist_id, position)
+        ) WITHOUT ROWID""")
+
+def _migrate_v7(cursor):
+    # Leading with source lets _drop_shadowed_stable find the stable rows without a full
+    # scan of songs, and still serves the per (title, artist) lazer lookup inside it
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_songs_source_title_artist ON songs(source, title, artist)")
+
+# Append only: each entry runs once, in order, and bumps PRAGMA user_version
+MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+]
+
+def migrate(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"[migrate] Upgrading songs.db schema to version {number}")
+        conn.execute("BEGIN")
+        try:
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+# Content hash when known, otherwise the file path stands in until the backfill hashes it
+TRACK_IDENTITY = "COALESCE(NULLIF(audio_hash, ''), 'path:' || folder || '/' || audio)"
+
+_NEW_TRACKS = f"""
+    INSERT OR IGNORE INTO tracks (identity)
+    SELECT DISTINCT {TRACK_IDENTITY} FROM songs WHERE track_id IS NULL
+"""
+_LINK_TRACKS = f"""
+    UPDATE songs SET track_id = (SELECT id FROM tracks WHERE identity = {TRACK_IDENTITY})
+    WHERE track_id IS NULL
+"""
+_PRUNE_TRACKS = "DELETE FROM tracks WHERE id NOT IN (SELECT track_id FROM songs WHERE track_id IS NOT NULL)"
+
+def _assign_tracks(cursor):
+    cursor.execute(_NEW_TRACKS)
+    cursor.execute(_LINK_TRACKS)
+    cursor.execute(_PRUNE_TRACKS)
+
+class FolderListing:
+    # Existence checks by folder instead of by file: one stat per folder, and a folder
+    # whose mtime still matches the one stored at index time is trusted as is (adding,
+    # removing or renaming an entry changes it). Any other folder is listed once.
+    TRUSTED = object()
+
+    def __init__(self, known_mtimes: Optional[Dict[str, int]] = None):
+        self.known_mtimes = known_mtimes or {}
+        self._folders = {}
+
+    def _entries(self, folder: str):
+        entries = self._folders.get(folder)
+        if entries is None:
             try:
-                cursor.execute(f"ALTER TABLE songs ADD COLUMN {col} {definition}")
-                conn.commit()
-            except sqlite3.OperationalError:
-                pass
-        conn.commit()
+                if self.known_mtimes.get(folder) == os.stat(folder).st_mtime_ns:
+                    entries = self.TRUSTED
+                else:
+                    entries = set(os.listdir(folder))
+            except OSError:
+                entries = set()
+            self._folders[folder] = entries
+        return entries
+
+    def folder_exists(self, folder: str) -> bool:
+        entries = self._entries(folder)
+        return entries is self.TRUSTED or bool(entries) or os.path.isdir(folder)
+
+    def has(self, folder: str, name: str) -> bool:
+        entries = self._entries(folder)
+        if entries is self.TRUSTED or name in entries:
+            return True
+        # The listing is exact, a stat settles case-insensitive filesystems and subfolders
+        return bool(entries) and os.path.exists(os.path.join(folder, name))
+
+def _stat_folders(folders) -> List[Tuple[str, int]]:
+    mtimes = []
+    for folder in folders:
+        try:
+            mtimes.append((folder, os.stat(folder).st_mtime_ns))
+        except OSError:
+            pass
+    return mtimes
+
+def _store_folder_mtimes(cursor, source_folder: str, mtimes: List[Tuple[str, int]], replace: bool):
+    # Only folders whose mtime changed are written. With replace, `mtimes` is the whole
+    # set for source_folder and stored folders missing from it are dropped.
+    stored = dict(cursor.execute(
+        "SELECT folder, mtime_ns FROM folder_mtimes WHERE source_folder = ?", (source_folder,)
+    ).fetchall())
+    cursor.executemany(
+        "INSERT OR REPLACE INTO folder_mtimes (folder, source_folder, mtime_ns) VALUES (?, ?, ?)",
+        [(folder, source_folder, mtime) for folder, mtime in mtimes if stored.get(folder) != mtime]
+    )
+    if replace:
+        current = {folder for folder, _ in mtimes}
+        cursor.executemany(
+            "DELETE FROM folder_mtimes WHERE folder = ?",
+            [(folder,) for folder in stored if folder not in current]
+        )
+
+def get_folder_mtimes() -> Dict[str, int]:
+    try:
+        with library_store.connection() as conn:
+            return dict(conn.execute("SELECT folder, mtime_ns FROM folder_mtimes").fetchall())
+    except Exception as e:
+        print(f"[get_folder_mtimes] Error: {e}")
+        return {}
 
 def validate_cache(folder) -> Tuple[bool, str, List[Dict]]:
-    if not DATABASE_FILE.exists():
+    if not library_store.path.exists():
         return False, "No cache database found", []
     
     # Convert Path to string if needed
@@ -58,7 +581,7 @@ def validate_cache(folder) -> Tuple[bool, str, List[Dict]]:
         return False, f"Folder not found: {folder_str}", []
     
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
+        with library_store.connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='metadata'")
@@ -70,24 +593,31 @@ def validate_cache(folder) -> Tuple[bool, str, List[Dict]]:
             current_mtime = str(os.path.getmtime(folder_str))
             
             cursor.execute(
-                "SELECT title, artist, mapper, audio, background, length, osu_file, folder, source_folder "
-                "FROM songs WHERE source_folder = ?",
+                "SELECT id, title, artist, mapper, audio, background, length, osu_file, folder, source_folder, source "
+                "FROM songs WHERE source_folder = ? AND missing_since IS NULL",
                 (folder_str,)
             )
             cached_songs = [
-                dict(zip(["title", "artist", "mapper", "audio", "background", "length", "osu_file", "folder", "source_folder"], row))
+                dict(zip(["id", "title", "artist", "mapper", "audio", "background", "length", "osu_file", "folder", "source_folder", "source"], row))
                 for row in cursor.fetchall()
             ]
             
             if not cached_songs:
                 return False, f"No songs cached for folder: {folder_str}", []
             
+            cursor.execute("SELECT folder, mtime_ns FROM folder_mtimes WHERE source_folder = ?", (folder_str,))
+            listing = FolderListing(dict(cursor.fetchall()))
             missing_songs = []
             valid_songs = 0
             
             for song in cached_songs:
-                osu_file_path = Path(song.get("folder", "")) / song.get("osu_file", "")
-                if not osu_file_path.exists():
+                osu_file = song.get("osu_file") or ""
+                song_folder = song.get("folder", "")
+                if osu_file:
+                    osu_ok = listing.has(os.path.dirname(osu_file) or song_folder, os.path.basename(osu_file))
+                else:
+                    osu_ok = listing.folder_exists(song_folder)
+                if not osu_ok or not _audio_exists(song, listing):
                     missing_songs.append(song)
                 else:
                     valid_songs += 1
@@ -109,168 +639,760 @@ def validate_cache(folder) -> Tuple[bool, str, List[Dict]]:
         print(f"[validate_cache] Error: {e}")
         return False, f"Cache validation error: {str(e)}", []
 
+SONG_COLUMNS = [
+    "id", "title", "artist", "mapper", "audio", "background", "length", "osu_file", "folder",
+    "source", "audio_hash", "bpm", "beatmap_id", "beatmapset_id", "dup_cluster", "track_id"
+]
+
+def _audio_exists(song: Dict, listing: FolderListing) -> bool:
+    folder = song.get("folder", "")
+    if song.get("source") == "lazer":
+        audio_hash = song.get("audio_hash", "")
+        if audio_hash:
+            return listing.has(folder, audio_hash)
+        return Path(folder).is_file()
+    audio = song.get("audio", "")
+    return bool(audio) and listing.has(folder, audio)
+
+# Per-beatmap fields, kept in each track's "maps" list
+MAP_FIELDS = ("id", "mapper", "osu_file", "beatmap_id", "beatmapset_id")
+
+def _group_tracks(songs: List[Dict]) -> List[Dict]:
+    # Maps sharing an audio file collapse into one entry, the first row found is the face of it
+    tracks = {}
+    for n, song in enumerate(songs):
+        beatmap = {k: song.get(k) for k in MAP_FIELDS}
+        key = song["track_id"] if song["track_id"] is not None else ("row", n)
+        track = tracks.get(key)
+        if track is None:
+            song["maps"] = [beatmap]
+            tracks[key] = song
+        else:
+            track["maps"].append(beatmap)
+            track["length"] = max(track.get("length") or 0, song.get("length") or 0)
+    return list(tracks.values())
+
+_LOAD_CACHE = f"""
+    SELECT {", ".join(SONG_COLUMNS)} FROM songs
+    WHERE source_folder = ? AND missing_since IS NULL
+    ORDER BY id
+"""
+
 def load_cache(folder) -> Optional[List[Dict]]:
-    if not DATABASE_FILE.exists():
+    if not library_store.path.exists():
         return None
+    init_db()
     folder_str = str(folder) if isinstance(folder, Path) else folder
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
+        with library_store.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT title, artist, mapper, audio, background, length,
-                       osu_file, folder, source, audio_hash
-                FROM songs 
-                WHERE source_folder = ?
-            """, (folder_str,))
-            
-            songs = [
-                dict(zip(["title", "artist", "mapper", "audio", "background",
-                          "length", "osu_file", "folder", "source", "audio_hash"], row))
-                for row in cursor.fetchall()
-            ]
-
-            valid_songs = []
-            for song in songs:
-                source = song.get("source", "stable")
-                song_folder = Path(song.get("folder", ""))
-                audio_hash = song.get("audio_hash", "")
-
-                if source == "lazer":
-                    hash_file = song_folder / audio_hash if audio_hash else song_folder
-                    if hash_file.exists() and hash_file.is_file():
-                        valid_songs.append(song)
-                else:
-                    audio = song.get("audio", "")
-                    if audio and (song_folder / audio).exists():
-                        valid_songs.append(song)
+            cursor.execute(_LOAD_CACHE, (folder_str,))
+            songs = [dict(zip(SONG_COLUMNS, row)) for row in cursor.fetchall()]
 
+            cursor.execute("SELECT folder, mtime_ns FROM folder_mtimes WHERE source_folder = ?", (folder_str,))
+            listing = FolderListing(dict(cursor.fetchall()))
+            valid_songs = _group_tracks([s for s in songs if _audio_exists(s, listing)])
             return valid_songs if valid_songs else None
     except Exception as e:
         print(f"[load_cache] Error: {e}")
         return None
 
-def remove_missing_songs(missing_songs: List[Dict]) -> int:
-    if not missing_songs:
-        return 0
-    
+_LOAD_LIBRARY = """
+    WITH sources(folder, priority) AS ({sources}),
+    live AS (
+        SELECT songs.id, COALESCE(songs.track_id, -songs.id) AS track, sources.priority
+        FROM songs JOIN sources ON songs.source_folder = sources.folder
+        WHERE songs.missing_since IS NULL
+    ),
+    faces AS (
+        SELECT *,
+               FIRST_VALUE(priority) OVER track_order AS track_priority,
+               FIRST_VALUE(id) OVER track_order AS first_id
+        FROM live
+        WINDOW track_order AS (PARTITION BY track ORDER BY priority, id)
+    )
+    SELECT {columns}
+    FROM faces JOIN songs ON songs.id = faces.id
+    WHERE faces.priority = faces.track_priority
+    ORDER BY track_priority, first_id, faces.id
+"""
+
+def _load_library_sql(folder_count: int) -> str:
+    return _LOAD_LIBRARY.format(
+        sources=" UNION ALL ".join("SELECT ?, ?" for _ in range(folder_count)),
+        columns=", ".join(f"songs.{c}" for c in SONG_COLUMNS)
+    )
+
+def load_library(folders: List) -> Optional[List[Dict]]:
+    # The whole startup library in one query: folders are in precedence order, SQL keeps
+    # one face per track in precedence order and merge_library applies the cluster and
+    # title/artist rules in a single pass. Nothing touches the disk here, see find_missing_audio.
+    if not library_store.path.exists():
+        return None
+    init_db()
+    folders = [str(f) for f in folders if f]
+    if not folders:
+        return None
+    params = [v for priority, folder in enumerate(folders) for v in (folder, priority)]
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            cursor = conn.cursor()
-            removed_count = 0
-            
-            for song in missing_songs:
-                cursor.execute("""
-                    DELETE FROM songs 
-                    WHERE title = ? AND artist = ? AND mapper = ?
-                """, (song.get("title"), song.get("artist"), song.get("mapper")))
-                removed_count += cursor.rowcount
-            
-            conn.commit()
-            print(f"[remove_missing_songs] Removed {removed_count} missing songs from cache")
-            return removed_count
-            
-    except Exception as e:
-        print(f"[remove_missing_songs] Error: {e}")
-        return 0
+        with library_store.connection() as conn:
+            rows = conn.execute(_load_library_sql(len(folders)), params).fetchall()
+    except sqlite3.Error as e:
+        print(f"[load_library] Error: {e}")
+        return None
+    songs = merge_library(_group_tracks([dict(zip(SONG_COLUMNS, row)) for row in rows]))
+    return songs if songs else None
+
+def find_missing_audio(songs: List[Dict]) -> List[Dict]:
+    listing = FolderListing(get_folder_mtimes())
+    return [s for s in songs if not _audio_exists(s, listing)]
+
+_TOMBSTONE_ROWS = """
+    UPDATE songs SET missing_since = ?
+    WHERE id IN (SELECT value FROM json_each(?)) AND missing_since IS NULL
+"""
+
+def _tombstone_songs(cursor, row_ids: List[int], now: int) -> int:
+    # One statement for the whole batch; rows stay in place so a rescan revives them
+    cursor.execute(_TOMBSTONE_ROWS, (now, json.dumps(row_ids)))
+    return cursor.rowcount
+
+def remove_missing_songs(missing_songs: List[Dict]) -> Future:
+    # Takes validate_cache's missing rows and marks exactly those rows missing, by id.
+    # The Future resolves to the number of rows removed.
+    row_ids = [song["id"] for song in missing_songs if song.get("id") is not None]
+
+    def report(future):
+        if future.exception():
+            print(f"[remove_missing_songs] Error: {future.exception()}")
+        else:
+            print(f"[remove_missing_songs] Removed {future.result()} missing songs from cache")
+
+    future = library_store.write(_tombstone_songs, row_ids, int(time.time()))
+    future.add_done_callback(report)
+    return future
+
+def _set_metadata(cursor, key: str, value: str):
+    cursor.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (key, value))
+
+def set_metadata(key: str, value: str) -> Future:
+    future = library_store.write(_set_metadata, key, value)
+    future.add_done_callback(lambda f: _log_write_errors(f, "set_metadata", f"saving '{key}'"))
+    return future
 
 def update_folder_mtime(folder: str):
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
-                (f'folder_mtime_{folder}', str(os.path.getmtime(folder)))
-            )
-            conn.commit()
+        set_metadata(f'folder_mtime_{folder}', str(os.path.getmtime(folder)))
     except Exception as e:
         print(f"[update_folder_mtime] Error: {e}")
 
-def save_cache(folder, maps: List[Dict], source: str = 'stable'):
+SONG_FIELDS = (
+    "title", "artist", "mapper", "audio", "background", "length", "osu_file", "folder",
+    "audio_hash", "bpm", "beatmap_id", "beatmapset_id",
+    "title_unicode", "artist_unicode", "map_source", "tags"
+)
+# Optional metadata: a source that does not provide it leaves what is stored alone
+_KEPT_IF_MISSING = (
+    "bpm", "beatmap_id", "beatmapset_id", "title_unicode", "artist_unicode", "map_source", "tags"
+)
+
+# Same row key and same file: keep what was derived from the file (hash, track, cluster)
+_SAME_FILE = """songs.folder IS excluded.folder AND songs.audio IS excluded.audio
+    AND (NULLIF(excluded.audio_hash, '') IS NULL OR excluded.audio_hash IS songs.audio_hash)"""
+
+_UPSERT_SONGS = f"""
+    INSERT INTO songs ({", ".join(SONG_FIELDS)}, source_folder, source)
+    SELECT {", ".join(SONG_FIELDS)}, ?, ?
+    FROM temp.incoming_songs AS incoming
+    WHERE ? != 'stable' OR NOT EXISTS (
+        SELECT 1 FROM songs AS lazer
+        WHERE lazer.title = incoming.title AND lazer.artist = incoming.artist
+          AND lazer.source = 'lazer' AND lazer.missing_since IS NULL
+    )
+    ON CONFLICT(title, artist, mapper, source_folder) DO UPDATE SET
+        audio = excluded.audio,
+        background = excluded.background,
+        length = CASE WHEN excluded.length > 0 THEN excluded.length ELSE songs.length END,
+        osu_file = excluded.osu_file,
+        folder = excluded.folder,
+        source = excluded.source,
+        audio_hash = CASE WHEN {_SAME_FILE} THEN songs.audio_hash ELSE NULLIF(excluded.audio_hash, '') END,
+        track_id = CASE WHEN {_SAME_FILE} THEN songs.track_id END,
+        dup_cluster = CASE WHEN {_SAME_FILE} THEN songs.dup_cluster END,
+        {", ".join(f"{c} = COALESCE(excluded.{c}, songs.{c})" for c in _KEPT_IF_MISSING)},
+        missing_since = NULL
+    WHERE songs.missing_since IS NOT NULL
+       OR songs.audio IS NOT excluded.audio OR songs.folder IS NOT excluded.folder
+       OR songs.background IS NOT excluded.background OR songs.osu_file IS NOT excluded.osu_file
+       OR songs.source IS NOT excluded.source
+       OR (excluded.length > 0 AND songs.length IS NOT excluded.length)
+       OR (NULLIF(excluded.audio_hash, '') IS NOT NULL AND songs.audio_hash IS NOT excluded.audio_hash)
+       OR {" OR ".join(f"(excluded.{c} IS NOT NULL AND songs.{c} IS NOT excluded.{c})" for c in _KEPT_IF_MISSING)}
+"""
+
+def _stage_songs(cursor, maps: List[Dict]):
+    # Scan results go into a per-connection temp table so the upsert and the
+    # tombstoning can both work on them as a set
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS incoming_songs (
+            {", ".join(SONG_FIELDS)},
+            UNIQUE (title, artist, mapper)
+        )""")
+    cursor.execute("DELETE FROM temp.incoming_songs")
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO temp.incoming_songs VALUES ({', '.join('?' * len(SONG_FIELDS))})",
+        [
+            (
+                s.get("title"), s.get("artist"), s.get("mapper"),
+                s.get("audio"), s.get("background"), s.get("length", 0),
+                s.get("osu_file", ""), s.get("folder"), s.get("audio_hash"),
+                s.get("bpm"), s.get("beatmap_id"), s.get("beatmapset_id"),
+                s.get("title_unicode"), s.get("artist_unicode"), s.get("map_source"), s.get("tags")
+            )
+            for s in maps
+        ])
+
+def _insert_songs(cursor, maps: List[Dict], folder_str: str, source: str) -> int:
+    # Upsert: rows that did not change are not written at all. Returns rows written.
+    _stage_songs(cursor, maps)
+    cursor.execute(_UPSERT_SONGS, (folder_str, source, source))
+    written = cursor.rowcount
+    shadowed = _drop_shadowed_stable(cursor)
+    if shadowed:
+        print(f"[save_cache] Dropped {shadowed} stable songs already provided by lazer")
+    _assign_tracks(cursor)
+    return written
+
+_DROP_SHADOWED_STABLE = """
+    DELETE FROM songs
+    WHERE source = 'stable' AND EXISTS (
+        SELECT 1 FROM songs AS lazer
+        WHERE lazer.title = songs.title AND lazer.artist = songs.artist
+          AND lazer.source = 'lazer' AND lazer.missing_since IS NULL
+    )
+"""
+
+def _drop_shadowed_stable(cursor) -> int:
+    # Lazer wins over stable for the same title/artist, resolved in one statement
+    # whichever side was written last
+    cursor.execute(_DROP_SHADOWED_STABLE)
+    return cursor.rowcount
+
+def _save_songs(cursor, maps: List[Dict], folder_str: str, source: str, mtime: str, folder_mtimes) -> int:
+    written = _insert_songs(cursor, maps, folder_str, source)
+    _set_metadata(cursor, f'folder_mtime_{folder_str}', mtime)
+    _store_folder_mtimes(cursor, folder_str, folder_mtimes, replace=False)
+    return written
+
+def save_cache(folder, maps: List[Dict], source: str = 'stable') -> Future:
     init_db()
     folder_str = str(folder) if isinstance(folder, Path) else folder
-    
+
+    def report(future):
+        if future.exception():
+            print(f"[save_cache] Error: {future.exception()}")
+        else:
+            print(f"[save_cache] Saved {len(maps)} {source} songs for folder: {folder_str} ({future.result()} written)")
+
+    try:
+        mtime = str(os.path.getmtime(folder_str))
+        folder_mtimes = _stat_folders({m.get("folder") for m in maps if m.get("folder")})
+        future = library_store.write(_save_songs, maps, folder_str, source, mtime, folder_mtimes)
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+    future.add_done_callback(report)
+    return future
+
+_TOMBSTONE_UNSCANNED = """
+    UPDATE songs SET missing_since = ?
+    WHERE source_folder = ? AND source = ? AND missing_since IS NULL AND NOT EXISTS (
+        SELECT 1 FROM temp.incoming_songs AS incoming
+        WHERE incoming.title IS songs.title AND incoming.artist IS songs.artist
+          AND incoming.mapper IS songs.mapper
+    )
+"""
+
+def _reconcile_songs(cursor, maps: List[Dict], folder_str: str, source: str, mtime: str, folder_mtimes) -> Tuple[int, int]:
+    written = _insert_songs(cursor, maps, folder_str, source)
+    cursor.execute(_TOMBSTONE_UNSCANNED, (int(time.time()), folder_str, source))
+    tombstoned = cursor.rowcount
+    _set_metadata(cursor, f'folder_mtime_{folder_str}', mtime)
+    _store_folder_mtimes(cursor, folder_str, folder_mtimes, replace=True)
+    return written, tombstoned
+
+def reconcile_cache(folder, maps: List[Dict], source: str = 'stable') -> Tuple[int, int]:
+    # A full scan of `folder`: upsert what changed and tombstone rows the scan no longer
+    # found. Returns (rows written, rows tombstoned).
+    init_db()
+    folder_str = str(folder) if isinstance(folder, Path) else folder
+
+    try:
+        mtime = str(os.path.getmtime(folder_str))
+        folder_mtimes = _stat_folders({m.get("folder") for m in maps if m.get("folder")})
+        written, tombstoned = library_store.write(
+            _reconcile_songs, maps, folder_str, source, mtime, folder_mtimes
+        ).result()
+        print(f"[reconcile_cache] {len(maps)} scanned, {written} written, {tombstoned} tombstoned in {folder_str}")
+        return written, tombstoned
+
+    except Exception as e:
+        print(f"[reconcile_cache] Error: {e}")
+        return 0, 0
+
+_LAZER_HASHES = """
+    SELECT audio_hash, length FROM songs
+    WHERE source = 'lazer' AND source_folder = ? AND missing_since IS NULL
+"""
+_TOMBSTONE_LAZER_HASH = (
+    "UPDATE songs SET missing_since = ? WHERE source = 'lazer' AND source_folder = ? AND audio_hash = ?"
+)
+_LAZER_ROWS_BY_HASH = f"""
+    SELECT {", ".join(SONG_COLUMNS)} FROM songs
+    WHERE source = 'lazer' AND source_folder = ? AND missing_since IS NULL
+      AND audio_hash IN (SELECT value FROM json_each(?))
+    ORDER BY id
+"""
+
+def _sync_lazer_rows(cursor, incoming: Dict[str, Dict], folder_str: str, mtime: str, folder_mtimes):
+    cursor.execute(_LAZER_HASHES, (folder_str,))
+    existing = {row[0]: row[1] for row in cursor.fetchall() if row[0]}
+
+    added = [s for h, s in incoming.items() if h not in existing]
+    removed = [h for h in existing if h not in incoming]
+    # Rows cached before the reader reported lengths get refreshed once
+    refreshed = [
+        s for h, s in incoming.items()
+        if h in existing and not existing[h] and s.get("length")
+    ]
+
+    now = int(time.time())
+    cursor.executemany(_TOMBSTONE_LAZER_HASH, [(now, folder_str, h) for h in removed])
+    _insert_songs(cursor, added + refreshed, folder_str, 'lazer')
+    _set_metadata(cursor, f'folder_mtime_{folder_str}', mtime)
+    _store_folder_mtimes(cursor, folder_str, folder_mtimes, replace=False)
+
+    # Hand back the rows as written rather than the reader's dicts, so new songs carry their row ids
+    cursor.execute(_LAZER_ROWS_BY_HASH, (folder_str, json.dumps([s["audio_hash"] for s in added])))
+    added = _group_tracks([dict(zip(SONG_COLUMNS, row)) for row in cursor.fetchall()])
+    return added, removed, len(existing) - len(removed)
+
+def sync_lazer_cache(folder, songs: List[Dict]) -> Tuple[List[Dict], List[str]]:
+    # Diff the reader output against the lazer rows already cached, keyed by audio hash,
+    # and only apply the inserts and deletes. Returns (added songs, removed hashes).
+    init_db()
+    folder_str = str(folder) if isinstance(folder, Path) else folder
+    incoming = {s.get("audio_hash"): s for s in songs if s.get("audio_hash")}
+
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
+        mtime = str(os.path.getmtime(folder_str))
+        folder_mtimes = _stat_folders({s.get("folder") for s in songs if s.get("folder")})
+        added, removed, unchanged = library_store.write(
+            _sync_lazer_rows, incoming, folder_str, mtime, folder_mtimes
+        ).result()
+        print(f"[sync_lazer_cache] {len(added)} added, {len(removed)} removed, {unchanged} unchanged")
+        return added, removed
+
+    except Exception as e:
+        print(f"[sync_lazer_cache] Error: {e}")
+        return [], []
+
+def search_songs(text: str, limit: int = 2000) -> Optional[List[Dict]]:
+    # Ranked prefix search over the FTS index. Every word has to match as a prefix
+    # somewhere. Returns best-first song rows, or None when the index is unavailable
+    # so the caller can fall back.
+    words = re.findall(r"\w+", text, re.UNICODE)
+    if not words:
+        return []
+    query = " ".join(f'"{w}"*' for w in words)
+    weights = ", ".join(str(w) for _, w in SEARCH_COLUMNS)
+    try:
+        with library_store.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT songs.source, songs.folder, songs.audio, songs.audio_hash, songs.title, songs.artist
+                FROM songs_fts JOIN songs ON songs.id = songs_fts.rowid
+                WHERE songs_fts MATCH ? AND songs.missing_since IS NULL
+                ORDER BY bm25(songs_fts, {weights})
+                LIMIT ?
+            """, (query, limit)).fetchall()
+            return [
+                dict(zip(["source", "folder", "audio", "audio_hash", "title", "artist"], row))
+                for row in rows
+            ]
+    except sqlite3.OperationalError as e:
+        print(f"[search_songs] Error: {e}")
+        return None
+
+# A play counts as skipped when it stopped before half the song and before 4 minutes
+SKIP_LIMIT_MS = 240000
+
+def _insert_plays(cursor, rows):
+    cursor.executemany("""
+        INSERT INTO plays (title, artist, source, folder, audio, audio_hash, started_at, listened_ms, skipped, speed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+class PlayRecorder:
+    # Finished plays are buffered on the GUI thread and handed to the writer in batches,
+    # so starting or skipping a song never waits on the database
+    FLUSH_AT = 20
+
+    def __init__(self):
+        self._pending = []
+
+    def record(self, song: Dict, started_at: float, listened_ms: int, duration_ms: int, speed: float):
+        skipped = listened_ms < min(duration_ms / 2, SKIP_LIMIT_MS) if duration_ms else False
+        self._pending.append((
+            song.get("title"), song.get("artist"), song.get("source", "stable"),
+            song.get("folder"), song.get("audio"), song.get("audio_hash"),
+            int(started_at), int(listened_ms), int(skipped), float(speed)
+        ))
+        if len(self._pending) >= self.FLUSH_AT:
+            self.flush()
+
+    def flush(self) -> Optional[Future]:
+        if not self._pending:
+            return None
+        rows, self._pending = self._pending, []
+        future = library_store.write(_insert_plays, rows)
+        future.add_done_callback(lambda f: _log_write_errors(f, "PlayRecorder", f"storing {len(rows)} plays"))
+        return future
+
+play_recorder = PlayRecorder()
+
+PLAY_STATS_COLUMNS = [
+    "title", "artist", "source", "folder", "audio", "audio_hash",
+    "play_count", "skip_count", "listened_ms", "last_played"
+]
+
+def _play_stats(where: str, order: str, limit: int) -> List[Dict]:
+    try:
+        with library_store.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(PLAY_STATS_COLUMNS)} FROM play_stats WHERE {where} ORDER BY {order} LIMIT ?",
+                (limit,)
+            ).fetchall()
+            return [dict(zip(PLAY_STATS_COLUMNS, row)) for row in rows]
+    except Exception as e:
+        print(f"[play_stats] Error: {e}")
+        return []
+
+def get_most_played(limit: int = 100) -> List[Dict]:
+    return _play_stats("play_count > 0", "play_count DESC, listened_ms DESC", limit)
+
+def get_recently_played(limit: int = 100) -> List[Dict]:
+    return _play_stats("1", "last_played DESC", limit)
+
+def get_cached_hashes(stats: List[Tuple[str, int, int]]) -> Dict[str, Tuple[str, str]]:
+    # stats: (path, size, mtime_ns). Returns path -> (fingerprint, hash) for entries whose
+    # size and mtime still match; either value may be None if it was never computed.
+    if not stats:
+        return {}
+    try:
+        with library_store.connection() as conn:
             cursor = conn.cursor()
-            if source == 'stable':
-                cursor.execute("SELECT title, artist FROM songs WHERE source = 'lazer'")
-                lazer_set = {(row[0], row[1]) for row in cursor.fetchall()}
-                maps = [
-                    s for s in maps 
-                    if (s.get("title"), s.get("artist")) not in lazer_set
-                ]
-                print(f"[save_cache] After lazer dedup: {len(maps)} stable songs to save")
-
-            cursor.execute("BEGIN TRANSACTION")
-            
-            for s in maps:
-                audio_hash = s.get("audio_hash")
-
-                if source == 'lazer':
-                    cursor.execute("""
-                        DELETE FROM songs
-                        WHERE title = ? AND artist = ? AND source = 'stable'
-                    """, (s.get("title"), s.get("artist")))
-
-                cursor.execute("""
-                    INSERT OR REPLACE INTO songs
-                    (title, artist, mapper, audio, background, length, 
-                     osu_file, folder, source_folder, source, audio_hash)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", (
-                        s.get("title"), s.get("artist"), s.get("mapper"),
-                        s.get("audio"), s.get("background"), s.get("length", 0),
-                        s.get("osu_file", ""), s.get("folder"), folder_str,
-                        source, audio_hash
-                    ))
-            
-            cursor.execute(
-                "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
-                (f'folder_mtime_{folder_str}', str(os.path.getmtime(folder_str)))
-            )
-            conn.commit()
-            print(f"[save_cache] Saved {len(maps)} {source} songs for folder: {folder_str}")
-            
+            cursor.execute("SELECT path, size, mtime_ns, fingerprint, hash FROM file_hashes")
+            known = {row[0]: row[1:] for row in cursor.fetchall()}
+        cached = {}
+        for path, size, mtime_ns in stats:
+            entry = known.get(path)
+            if entry and entry[0] == size and entry[1] == mtime_ns:
+                cached[path] = (entry[2], entry[3])
+        return cached
     except Exception as e:
-        print(f"[save_cache] Error: {e}")
+        print(f"[get_cached_hashes] Error: {e}")
+        return {}
 
-def clear_cache(folder: Optional[str] = None):
-    if not DATABASE_FILE.exists():
-        return
-    
+_SET_AUDIO_HASH = """
+    UPDATE songs SET audio_hash = ?, track_id = NULL
+    WHERE folder = ? AND audio = ? AND source != 'lazer' AND audio_hash IS NOT ?
+"""
+
+def _store_file_hashes(cursor, rows, song_updates):
+    cursor.executemany(
+        "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, fingerprint, hash) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    # Rows that already have the hash are left alone, so their track is kept
+    cursor.executemany(_SET_AUDIO_HASH, [(h, folder, audio, h) for h, folder, audio in song_updates])
+    if song_updates and cursor.rowcount > 0:
+        # A hashed file may now share a track with its lazer or stable twins
+        _assign_tracks(cursor)
+
+def store_file_hashes(rows: List[Tuple[str, int, int, str, str]], song_updates: List[Tuple[str, str, str]]):
+    # rows: (path, size, mtime_ns, fingerprint, hash), song_updates: (audio_hash, folder, audio)
+    try:
+        library_store.write(_store_file_hashes, rows, song_updates).result()
+    except Exception as e:
+        print(f"[store_file_hashes] Error: {e}")
+
+def get_audio_files() -> List[Tuple[str, str, str, str]]:
+    # (source, folder, audio, audio_hash) for every cached song, not just the merged survivors
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
+        with library_store.connection() as conn:
             cursor = conn.cursor()
-            
-            if folder:
-                cursor.execute("DELETE FROM songs WHERE source_folder = ?", (folder,))
-                cursor.execute("DELETE FROM metadata WHERE key = ?", (f'folder_mtime_{folder}',))
-                print(f"[clear_cache] Cleared cache for folder: {folder}")
-            else:
-                cursor.execute("DELETE FROM songs")
-                cursor.execute("DELETE FROM metadata")
-                print("[clear_cache] Cleared entire cache database")
-            
-            conn.commit()
-            
+            cursor.execute("SELECT source, folder, audio, audio_hash FROM songs WHERE missing_since IS NULL")
+            return cursor.fetchall()
+    except Exception as e:
+        print(f"[get_audio_files] Error: {e}")
+        return []
+
+def get_cached_acoustic_fingerprints(stats: List[Tuple[str, int, int]]) -> Dict[str, bytes]:
+    if not stats:
+        return {}
+    try:
+        with library_store.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT path, size, mtime_ns, fingerprint FROM acoustic_fingerprints")
+            known = {row[0]: row[1:] for row in cursor.fetchall()}
+        cached = {}
+        for path, size, mtime_ns in stats:
+            entry = known.get(path)
+            if entry and entry[0] == size and entry[1] == mtime_ns:
+                cached[path] = entry[2]
+        return cached
+    except Exception as e:
+        print(f"[get_cached_acoustic_fingerprints] Error: {e}")
+        return {}
+
+def _store_acoustic_fingerprints(cursor, rows):
+    cursor.executemany(
+        "INSERT OR REPLACE INTO acoustic_fingerprints (path, size, mtime_ns, fingerprint) VALUES (?, ?, ?, ?)",
+        rows
+    )
+
+def store_acoustic_fingerprints(rows: List[Tuple[str, int, int, bytes]]) -> Future:
+    # Cache only, so the caller does not wait: batches queue up and share transactions
+    future = library_store.write(_store_acoustic_fingerprints, rows)
+    future.add_done_callback(lambda f: _log_write_errors(f, "store_acoustic_fingerprints"))
+    return future
+
+_SET_LAZER_CLUSTER = "UPDATE songs SET dup_cluster = ? WHERE source = 'lazer' AND audio_hash = ?"
+_SET_FILE_CLUSTER = "UPDATE songs SET dup_cluster = ? WHERE source != 'lazer' AND folder = ? AND audio = ?"
+
+def _store_dup_clusters(cursor, lazer_rows, file_rows):
+    cursor.execute("UPDATE songs SET dup_cluster = NULL WHERE dup_cluster IS NOT NULL")
+    cursor.executemany(_SET_LAZER_CLUSTER, lazer_rows)
+    cursor.executemany(_SET_FILE_CLUSTER, file_rows)
+
+def store_dup_clusters(lazer_rows: List[Tuple[int, str]], file_rows: List[Tuple[int, str, str]]):
+    # lazer_rows: (cluster, audio_hash), file_rows: (cluster, folder, audio). Clusters are rebuilt wholesale.
+    try:
+        library_store.write(_store_dup_clusters, lazer_rows, file_rows).result()
     except Exception as e:
-        print(f"[clear_cache] Error: {e}")
+        print(f"[store_dup_clusters] Error: {e}")
+
+def _clear_songs(cursor, folder: Optional[str]):
+    if folder:
+        cursor.execute("DELETE FROM songs WHERE source_folder = ?", (folder,))
+        cursor.execute("DELETE FROM metadata WHERE key = ?", (f'folder_mtime_{folder}',))
+        cursor.execute(_PRUNE_TRACKS)
+    else:
+        cursor.execute("DELETE FROM songs")
+        cursor.execute("DELETE FROM tracks")
+        cursor.execute("DELETE FROM metadata")
+
+def clear_cache(folder: Optional[str] = None) -> Optional[Future]:
+    if not library_store.path.exists():
+        return None
+
+    def report(future):
+        if future.exception():
+            print(f"[clear_cache] Error: {future.exception()}")
+        elif folder:
+            print(f"[clear_cache] Cleared cache for folder: {folder}")
+        else:
+            print("[clear_cache] Cleared entire cache database")
+
+    future = library_store.write(_clear_songs, folder)
+    future.add_done_callback(report)
+    return future
+
+QUEUE_PLAYLIST = "__queue__"  # the session queue, hidden from list_playlists
+
+def _save_playlist(cursor, name: str, song_ids: List[int], current_index: int, position_ms: int) -> int:
+    cursor.execute("""
+        INSERT INTO playlists (name, current_index, position_ms, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            current_index = excluded.current_index,
+            position_ms = excluded.position_ms,
+            updated_at = excluded.updated_at
+    """, (name, current_index, position_ms, int(time.time())))
+    playlist_id = cursor.execute("SELECT id FROM playlists WHERE name = ?", (name,)).fetchone()[0]
+    cursor.execute("DELETE FROM playlist_items WHERE playlist_id = ?", (playlist_id,))
+    cursor.executemany(
+        "INSERT INTO playlist_items (playlist_id, position, song_id) VALUES (?, ?, ?)",
+        [(playlist_id, position, song_id) for position, song_id in enumerate(song_ids)]
+    )
+    return playlist_id
+
+def save_playlist(name: str, song_ids: List[int], current_index: int = 0, position_ms: int = 0) -> Future:
+    future = library_store.write(_save_playlist, name, list(song_ids), current_index, position_ms)
+    future.add_done_callback(lambda f: _log_write_errors(f, "save_playlist", f"saving '{name}'"))
+    return future
+
+def load_playlist(name: str) -> Optional[Tuple[List[int], int, int]]:
+    # (song ids in order, current index, position in ms), or None if there is no such playlist
+    try:
+        with library_store.connection() as conn:
+            row = conn.execute(
+                "SELECT id, current_index, position_ms FROM playlists WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                return None
+            song_ids = [r[0] for r in conn.execute(
+                "SELECT song_id FROM playlist_items WHERE playlist_id = ? ORDER BY position", (row[0],)
+            )]
+            return song_ids, row[1], row[2]
+    except Exception as e:
+        print(f"[load_playlist] Error: {e}")
+        return None
+
+def list_playlists() -> List[Dict]:
+    try:
+        with library_store.connection() as conn:
+            rows = conn.execute("""
+                SELECT name, (SELECT COUNT(*) FROM playlist_items WHERE playlist_id = playlists.id), updated_at
+                FROM playlists WHERE name != ? ORDER BY name COLLATE NOCASE
+            """, (QUEUE_PLAYLIST,)).fetchall()
+            return [dict(zip(["name", "count", "updated_at"], row)) for row in rows]
+    except Exception as e:
+        print(f"[list_playlists] Error: {e}")
+        return []
+
+def _delete_playlist(cursor, name: str):
+    cursor.execute("DELETE FROM playlists WHERE name = ?", (name,))
+
+def delete_playlist(name: str) -> Future:
+    future = library_store.write(_delete_playlist, name)
+    future.add_done_callback(lambda f: _log_write_errors(f, "delete_playlist", f"deleting '{name}'"))
+    return future
+
+_SONG_KEYS_IN_FOLDER = "SELECT title, artist, audio FROM songs WHERE folder = ?"
+
+def get_song_keys(folder) -> set:
+    # (title, artist, audio) of every row whose files live in `folder`
+    try:
+        with library_store.connection() as conn:
+            return set(conn.execute(_SONG_KEYS_IN_FOLDER, (str(folder),)).fetchall())
+    except Exception as e:
+        print(f"[get_song_keys] Error: {e}")
+        return set()
+
+# Statements that run per scan, per folder or per file. tests/test_query_plans.py checks
+# that none of them falls back to a full scan of songs.
+HOT_STATEMENTS = {
+    "load_cache": _LOAD_CACHE,
+    "load_library": _load_library_sql(3),
+    "upsert_songs": _UPSERT_SONGS,
+    "tombstone_unscanned": _TOMBSTONE_UNSCANNED,
+    "tombstone_rows": _TOMBSTONE_ROWS,
+    "drop_shadowed_stable": _DROP_SHADOWED_STABLE,
+    "new_tracks": _NEW_TRACKS,
+    "link_tracks": _LINK_TRACKS,
+    "prune_tracks": _PRUNE_TRACKS,
+    "lazer_hashes": _LAZER_HASHES,
+    "tombstone_lazer_hash": _TOMBSTONE_LAZER_HASH,
+    "lazer_rows_by_hash": _LAZER_ROWS_BY_HASH,
+    "set_audio_hash": _SET_AUDIO_HASH,
+    "set_lazer_cluster": _SET_LAZER_CLUSTER,
+    "set_file_cluster": _SET_FILE_CLUSTER,
+    "song_keys_in_folder": _SONG_KEYS_IN_FOLDER,
+}
+
+MAINTENANCE_INTERVAL = 24 * 3600
+TOMBSTONE_RETENTION = 30 * 24 * 3600  # missing songs are kept this long in case they come back
+VACUUM_FREE_SHARE = 0.25  # share of free pages that makes the one-time full VACUUM worth it
+QUICK_CHECK_LIMIT = 100
+
+def _run_maintenance(cursor, min_interval: float) -> Optional[Dict]:
+    # Runs on the writer connection outside a batch, so VACUUM and the checkpoint are allowed
+    now = time.time()
+    row = cursor.execute("SELECT value FROM metadata WHERE key = 'last_maintenance'").fetchone()
+    if row and now - float(row[0]) < min_interval:
+        return None
+    started = time.perf_counter()
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    size_before = cursor.execute("PRAGMA page_count").fetchone()[0] * page_size
+
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute(
+        "DELETE FROM songs WHERE missing_since IS NOT NULL AND missing_since < ?",
+        (int(now - TOMBSTONE_RETENTION),)
+    )
+    purged = cursor.rowcount
+    cursor.execute(_PRUNE_TRACKS)
+    cursor.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('last_maintenance', ?)", (str(now),))
+    cursor.execute("COMMIT")
+
+    # Planner statistics: a full but bounded ANALYZE the first time, PRAGMA optimize after that
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        cursor.execute("PRAGMA optimize")
+    else:
+        cursor.execute("PRAGMA analysis_limit = 400")
+        cursor.execute("ANALYZE")
+
+    # New databases are created with incremental auto_vacuum and only release free pages.
+    # Older ones need a full VACUUM to switch, which holds the writer, so that only
+    # happens once a good share of the file is free pages
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        cursor.execute("PRAGMA incremental_vacuum").fetchall()
+    else:
+        free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages >= cursor.execute("PRAGMA page_count").fetchone()[0] * VACUUM_FREE_SHARE:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+
+    cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    problems = [
+        r[0] for r in cursor.execute(f"PRAGMA quick_check({QUICK_CHECK_LIMIT})").fetchall() if r[0] != "ok"
+    ]
+    size_after = cursor.execute("PRAGMA page_count").fetchone()[0] * page_size
+    return {
+        "size": size_after,
+        "freed": size_before - size_after,
+        "purged": purged,
+        "problems": problems,
+        "seconds": time.perf_counter() - started,
+    }
+
+def run_maintenance(min_interval: float = MAINTENANCE_INTERVAL) -> Future:
+    # Queued behind pending writes and never waited on; does nothing if it ran recently
+    def report(future):
+        if future.exception():
+            print(f"[maintenance] Error: {future.exception()}")
+            return
+        result = future.result()
+        if result is None:
+            return
+        status = "ok" if not result["problems"] else f"{len(result['problems'])} problems: {result['problems'][:3]}"
+        print(
+            f"[maintenance] songs.db {result['size'] / 1048576:.1f} MB "
+            f"(freed {result['freed'] / 1048576:.1f} MB, purged {result['purged']} old missing songs), "
+            f"integrity {status}, took {result['seconds']:.2f}s"
+        )
+
+    future = library_store.write(_run_maintenance, min_interval, transaction=False)
+    future.add_done_callback(report)
+    return future
 
 def get_cache_stats() -> Dict:
-    if not DATABASE_FILE.exists():
+    if not library_store.path.exists():
         return {"total_songs": 0, "folders": []}
     
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
+        with library_store.connection() as conn:
             cursor = conn.cursor()
             
             # Total songs
-            cursor.execute("SELECT COUNT(*) FROM songs")
+            cursor.execute("SELECT COUNT(*) FROM songs WHERE missing_since IS NULL")
             total = cursor.fetchone()[0]
             
             # Songs per folder
             cursor.execute("""
                 SELECT source_folder, COUNT(*) 
                 FROM songs 
+                WHERE missing_since IS NULL
                 GROUP BY source_folder
             """)
             folders = [{"folder": row[0] or "Unknown", "count": row[1]} for row in cursor.fetchall()]
@@ -304,8 +1426,23 @@ def get_audio_path(song: dict) -> Path:
     print(f"[get_audio_path] Using stable path: {folder}/{audio}")
     return Path(folder) / audio
 
-def get_lazer_audio_path(song: dict) -> Path:
+def _link_or_copy(src: Path, dst: Path) -> str:
+    # Hardlink first (same volume, no data written), then symlink, copy only as a last resort
+    try:
+        os.link(src, dst)
+        return "Linked"
+    except OSError:
+        pass
+    try:
+        os.symlink(src, dst)
+        return "Symlinked"
+    except OSError:
+        pass
     import shutil
+    shutil.copy2(str(src), str(dst))
+    return "Copied"
+
+def get_lazer_audio_path(song: dict) -> Path:
     audio_hash = song.get("audio_hash", "")
     audio_filename = song.get("audio", "audio.mp3")
     ext = Path(audio_filename).suffix or ".mp3"
@@ -319,13 +1456,15 @@ def get_lazer_audio_path(song: dict) -> Path:
     if not cached.exists():
         if hash_file.exists() and hash_file.is_file():
             try:
-                shutil.copy2(str(hash_file), str(cached))
-                print(f"[LazerAudio] Copied {hash_file.name} → {cached.name}")
+                if cached.is_symlink():
+                    cached.unlink()  # dangling link from a file lazer has since removed
+                action = _link_or_copy(hash_file, cached)
+                print(f"[LazerAudio] {action} {hash_file.name} → {cached.name}")
             except Exception as e:
-                print(f"[LazerAudio] Copy failed: {e}")
+                print(f"[LazerAudio] Link failed: {e}")
                 return hash_file
         else:
             print(f"[LazerAudio] Hash file not found: {hash_file}")
             return hash_file
 
-    return cached
\ No newline at end of file
+    return cached
@@ -0,0 +1,182 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import numpy as np
+from PySide6.QtCore import Signal, QThread
+from osuRadio.config import get_ffmpeg_bin_path, get_silent_subprocess_kwargs
+from osuRadio.db import (
+    init_db, releases_connection, get_audio_files, get_cached_acoustic_fingerprints,
+    store_acoustic_fingerprints, store_dup_clusters
+)
+
+# 30s of 8 kHz mono after leading silence, cut into half-second frames. Each frame
+# becomes 16 bits: the sign of the change in energy difference between adjacent bands
+# (Haitsma/Kalker style), which survives re-encoding and volume changes.
+SAMPLE_RATE = 8000
+EXCERPT_SECONDS = 30
+FRAME_SAMPLES = SAMPLE_RATE // 2
+BAND_EDGES = np.geomspace(250, 3000, 18)
+
+MAX_BIT_ERROR = 0.35   # share of differing bits still treated as the same recording
+MAX_SHIFT = 4          # frames of misalignment tolerated when comparing
+MIN_OVERLAP = 20       # frames that have to line up for a comparison to count
+MAX_BUCKET = 64        # index keys shared by more songs than this are too common to be useful
+
+_bins = np.fft.rfftfreq(FRAME_SAMPLES, 1 / SAMPLE_RATE)
+_band_matrix = np.stack([
+    (_bins >= lo) & (_bins < hi) for lo, hi in zip(BAND_EDGES[:-1], BAND_EDGES[1:])
+], axis=1).astype(np.float32)
+_window = np.hanning(FRAME_SAMPLES).astype(np.float32)
+
+def decode_excerpt(path: str) -> np.ndarray:
+    cmd = [
+        str(get_ffmpeg_bin_path()), "-v", "error", "-i", path,
+        "-af", "silenceremove=start_periods=1:start_threshold=-50dB",
+        "-t", str(EXCERPT_SECONDS), "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "s16le", "-"
+    ]
+    result = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60,
+        **get_silent_subprocess_kwargs()
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+def compute_acoustic_fingerprint(path: str) -> bytes:
+    try:
+        samples = decode_excerpt(path)
+    except Exception as e:
+        print(f"[DuplicateDetector] Failed to decode {path}: {e}")
+        return b""
+    frames = len(samples) // FRAME_SAMPLES
+    if frames <= MIN_OVERLAP:
+        return b""
+
+    x = samples[:frames * FRAME_SAMPLES].astype(np.float32).reshape(frames, FRAME_SAMPLES)
+    spectrum = np.abs(np.fft.rfft(x * _window, axis=1)) ** 2
+    energy = spectrum @ _band_matrix
+    band_diff = energy[:, :-1] - energy[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    return np.packbits(bits, axis=1, bitorder="little").tobytes()
+
+def bit_error_rate(a: np.ndarray, b: np.ndarray) -> float:
+    best = 1.0
+    for shift in range(-MAX_SHIFT, MAX_SHIFT + 1):
+        x, y = (a[shift:], b) if shift >= 0 else (a, b[-shift:])
+        n = min(len(x), len(y))
+        if n < MIN_OVERLAP:
+            continue
+        errors = np.unpackbits((x[:n] ^ y[:n]).view(np.uint8)).sum()
+        best = min(best, errors / (n * 16))
+    return best
+
+def cluster_fingerprints(fingerprints: List[np.ndarray]) -> List[int]:
+    # Returns a root index per fingerprint. Candidates come from an inverted index on
+    # pairs of consecutive frames, so only songs sharing a 32-bit key get compared.
+    parent = list(range(len(fingerprints)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    keys, owners = [], []
+    for i, fp in enumerate(fingerprints):
+        if len(fp) < 2:
+            continue
+        k = np.unique((fp[:-1].astype(np.uint32) << 16) | fp[1:])
+        keys.append(k)
+        owners.append(np.full(len(k), i, dtype=np.int32))
+    if not keys:
+        return parent
+
+    keys = np.concatenate(keys)
+    owners = np.concatenate(owners)
+    order = np.argsort(keys, kind="stable")
+    keys, owners = keys[order], owners[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    usable = (sizes > 1) & (sizes <= MAX_BUCKET)
+
+    compared = set()
+    for start, size in zip(starts[usable], sizes[usable]):
+        members = owners[start:start + size].tolist()
+        for n, a in enumerate(members):
+            for b in members[n + 1:]:
+                ra, rb = find(a), find(b)
+                if ra == rb or (a, b) in compared:
+                    continue
+                compared.add((a, b))
+                if bit_error_rate(fingerprints[a], fingerprints[b]) <= MAX_BIT_ERROR:
+                    parent[max(ra, rb)] = min(ra, rb)
+
+    return [find(i) for i in range(len(parent))]
+
+class DuplicateDetector(QThread):
+    done = Signal(dict)  # {song_identity: dup_cluster}
+    progress_update = Signal(str)
+
+    BATCH_SIZE = 32
+
+    @releases_connection
+    def run(self):
+        init_db()
+        files = {}
+        for source, folder, audio, audio_hash in get_audio_files():
+            if source == "lazer":
+                if not audio_hash:
+                    continue
+                key, path = ("lazer", audio_hash), os.path.join(folder, audio_hash)
+            else:
+                key, path = ("file", folder, audio), os.path.join(folder, audio)
+            files.setdefault(path, []).append(key)
+
+        stats = []
+        for path in files:
+            try:
+                st = os.stat(path)
+                stats.append((path, st.st_size, st.st_mtime_ns))
+            except OSError:
+                pass
+        if self.isInterruptionRequested():
+            return
+
+        fingerprints = get_cached_acoustic_fingerprints(stats)
+        pending = [s for s in stats if s[0] not in fingerprints]
+        print(f"[DuplicateDetector] {len(fingerprints)} fingerprints cached, {len(pending)} to compute")
+
+        workers = min(4, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i in range(0, len(pending), self.BATCH_SIZE):
+                if self.isInterruptionRequested():
+                    print("[DuplicateDetector] Interruption requested, stopping.")
+                    return
+                batch = pending[i:i + self.BATCH_SIZE]
+                results = list(pool.map(compute_acoustic_fingerprint, [s[0] for s in batch]))
+                # Empty results are stored too, so undecodable files are not retried every run
+                store_acoustic_fingerprints([(*s, fp) for s, fp in zip(batch, results)])
+                fingerprints.update((s[0], fp) for s, fp in zip(batch, results))
+                self.progress_update.emit(
+                    f"[DuplicateDetector] Fingerprinted {min(i + self.BATCH_SIZE, len(pending))}/{len(pending)}"
+                )
+
+        paths = [p for p, fp in fingerprints.items() if fp]
+        roots = cluster_fingerprints([np.frombuffer(fingerprints[p], dtype="<u2") for p in paths])
+
+        members = {}
+        for path, root in zip(paths, roots):
+            members.setdefault(root, []).append(path)
+
+        clusters = {}
+        for cluster_id, group in enumerate((g for g in members.values() if len(g) > 1), start=1):
+            for path in group:
+                for key in files[path]:
+                    clusters[key] = cluster_id
+
+        store_dup_clusters(
+            [(c, key[1]) for key, c in clusters.items() if key[0] == "lazer"],
+            [(c, key[1], key[2]) for key, c in clusters.items() if key[0] == "file"]
+        )
+        print(f"[DuplicateDetector] {len(clusters)} songs in {len(set(clusters.values()))} duplicate clusters")
+        self.done.emit(clusters)
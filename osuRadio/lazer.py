@@ -1,13 +1,15 @@
+import os
 import sys
 import json
 import hashlib
 import subprocess
 import tempfile
-import time
+import threading
+from collections import deque
 from pathlib import Path
 from PySide6.QtCore import QThread, Signal
 from osuRadio.config import get_lazer_reader_path, get_silent_subprocess_kwargs
-from osuRadio.db import save_cache
+from osuRadio.db import sync_lazer_cache, load_cache, releases_connection
 
 def compute_file_hash(path: str) -> str:
     h = hashlib.sha256()
@@ -20,7 +22,39 @@ def compute_file_hash(path: str) -> str:
         return ""
 
 
-def run_lazer_reader(lazer_dir: str, progress_cb=None) -> list:
+FINGERPRINT_BLOCK = 4096
+# Fingerprints taken with another block size are not comparable, the prefix tells them apart
+FINGERPRINT_PREFIX = f"b{FINGERPRINT_BLOCK}:"
+
+def compute_file_fingerprint(path: str) -> str:
+    # Cheap first-stage identity: file size plus a hash of the head, middle and tail blocks,
+    # 12 KB per file at most. Only files that collide on this get a full compute_file_hash.
+    try:
+        size = os.path.getsize(path)
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            if size <= FINGERPRINT_BLOCK * 3:
+                h.update(f.read())
+            else:
+                for offset in (0, (size - FINGERPRINT_BLOCK) // 2, size - FINGERPRINT_BLOCK):
+                    f.seek(offset)
+                    h.update(f.read(FINGERPRINT_BLOCK))
+        return f"{FINGERPRINT_PREFIX}{size:x}-{h.hexdigest()}"
+    except Exception:
+        return ""
+
+
+def _pump_lines(stream, handler):
+    try:
+        for line in iter(stream.readline, ""):
+            line = line.rstrip()
+            if line:
+                handler(line)
+    finally:
+        stream.close()
+
+
+def run_lazer_reader(lazer_dir: str, progress_cb=None, on_start=None) -> list:
     reader_path = get_lazer_reader_path()
     frozen = getattr(sys, "frozen", False)
 
@@ -37,23 +71,51 @@ def run_lazer_reader(lazer_dir: str, progress_cb=None) -> list:
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
             **get_silent_subprocess_kwargs()
         )
     except FileNotFoundError as e:
         print(f"[LazerReader] Could not find reader: {e}")
         return []
 
-    dots = 0
-    while proc.poll() is None:
-        time.sleep(0.1)
-        dots += 1
-        if progress_cb and dots % 10 == 0:
-            n = (dots // 10) % 4
-            progress_cb(f"[osu!Lazer] 📖 Reading osu!Lazer library{'.' * (n + 1)}")
+    if on_start:
+        on_start(proc)
+
+    stderr_tail = deque(maxlen=50)
+
+    def on_stdout(line):
+        # "[Progress] n/N" lines are the reader's progress channel, everything else is log output
+        if line.startswith("[Progress]"):
+            try:
+                done, total = line.split()[1].split("/")
+                if progress_cb:
+                    progress_cb(f"[osu!Lazer] 📖 Reading osu!Lazer library... ({done} of {total} beatmaps)")
+            except (IndexError, ValueError):
+                pass
+        else:
+            print(f"[LazerReader] {line}")
+
+    def on_stderr(line):
+        stderr_tail.append(line)
+        print(f"[LazerReader] {line}")
+
+    # Drain both pipes concurrently so a chatty reader can never block on a full pipe
+    pumps = [
+        threading.Thread(target=_pump_lines, args=(proc.stdout, on_stdout), daemon=True),
+        threading.Thread(target=_pump_lines, args=(proc.stderr, on_stderr), daemon=True),
+    ]
+    for t in pumps:
+        t.start()
+    proc.wait()
+    for t in pumps:
+        t.join()
 
     if proc.returncode != 0:
-        stderr = proc.stderr.read()
-        print(f"[LazerReader] Error output: {stderr}")
+        print(f"[LazerReader] Exited with code {proc.returncode}")
+        if stderr_tail:
+            print(f"[LazerReader] Error output: {chr(10).join(stderr_tail)}")
         return []
 
     cache_dir = Path(tempfile.gettempdir()) / "OsuRadioCache"
@@ -70,6 +132,39 @@ def run_lazer_reader(lazer_dir: str, progress_cb=None) -> list:
         return []
 
 
+def _online_id(value):
+    # lazer uses -1 (or 0) for maps that were never submitted
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _entry_to_song(entry: dict) -> dict:
+    return {
+        "title":            entry.get("title",          "Unknown"),
+        "artist":           entry.get("artist",         "Unknown"),
+        "mapper":           entry.get("mapper",         "Unknown"),
+        "title_unicode":    entry.get("titleUnicode")   or "",
+        "artist_unicode":   entry.get("artistUnicode")  or "",
+        "map_source":       entry.get("source")         or "",
+        "tags":             entry.get("tags")           or "",
+        "audio":            entry.get("audioFilename",  "audio.mp3"),
+        "audio_path":       entry.get("audioPath",      ""),
+        "audio_hash":       entry.get("audioHash",      ""),
+        "background":       entry.get("backgroundPath") or "",
+        "background_hash":  entry.get("backgroundHash") or "",
+        "length":           int(entry.get("length") or 0),
+        "bpm":              float(entry.get("bpm") or 0),
+        "beatmap_id":       _online_id(entry.get("beatmapId")),
+        "beatmapset_id":    _online_id(entry.get("beatmapSetId")),
+        "osu_file":         "",
+        "folder":           entry.get("audioPath",      ""),
+        "source":           "lazer",
+    }
+
+
 def convert_lazer_to_songs(raw: list) -> list:
     seen = {}
     for entry in raw:
@@ -83,51 +178,54 @@ def convert_lazer_to_songs(raw: list) -> list:
         if key not in seen:
             seen[key] = entry
 
-    songs = []
-    for entry in seen.values():
-        songs.append({
-            "title":            entry.get("title",          "Unknown"),
-            "artist":           entry.get("artist",         "Unknown"),
-            "mapper":           entry.get("mapper",         "Unknown"),
-            "audio":            entry.get("audioFilename",  "audio.mp3"),
-            "audio_path":       entry.get("audioPath",      ""),
-            "audio_hash":       entry.get("audioHash",      ""),
-            "background":       entry.get("backgroundPath") or "",
-            "background_hash":  entry.get("backgroundHash") or "",
-            "length":           0,
-            "osu_file":         "",
-            "folder":           entry.get("audioPath",      ""),
-            "source":           "lazer",
-        })
-    return songs
+    return [_entry_to_song(entry) for entry in seen.values()]
 
 
 class LazerScanner(QThread):
-    done = Signal(list)
+    done = Signal(list, list)  # (added songs, or every cached lazer song when full; removed audio hashes)
     progress_update = Signal(str)
 
-    def __init__(self, lazer_dir: str):
+    def __init__(self, lazer_dir: str, full: bool = False):
         super().__init__()
         self.lazer_dir = lazer_dir
+        self.full = full
+        self._proc = None
 
+    def requestInterruption(self):
+        super().requestInterruption()
+        proc = self._proc
+        if proc and proc.poll() is None:
+            print("[LazerScanner] Killing lazer reader process.")
+            proc.kill()
+
+    def _on_reader_started(self, proc):
+        self._proc = proc
+        # Interruption may have been requested before the process existed
+        if self.isInterruptionRequested():
+            proc.kill()
+
+    @releases_connection
     def run(self):
         self.progress_update.emit("[osu!Lazer] 📖 Reading osu!Lazer library...")
 
         raw = run_lazer_reader(
             self.lazer_dir,
-            progress_cb=lambda msg: self.progress_update.emit(msg)
+            progress_cb=lambda msg: self.progress_update.emit(msg),
+            on_start=self._on_reader_started
         )
+        self._proc = None
 
-        if not raw:
-            self.progress_update.emit("[osu!Lazer] ⚠️ No lazer data found or reader failed.")
-            self.done.emit([])
+        if self.isInterruptionRequested():
+            print("[LazerScanner] Interruption requested, stopping.")
             return
 
-        if self.isInterruptionRequested():
+        if not raw:
+            self.progress_update.emit("[osu!Lazer] ⚠️ No lazer data found or reader failed.")
+            self.done.emit((load_cache(self.lazer_dir) or []) if self.full else [], [])
             return
 
         total = len(raw)
-        self.progress_update.emit(f"[osu!Lazer] 🔍 Scanning osu!Lazer... (found {total} beatmaps)")
+        self.progress_update.emit(f"[osu!Lazer] 🔍 Scanning osu!Lazer... (found {total} audio files)")
 
         seen = {}
         processed = 0
@@ -158,24 +256,14 @@ class LazerScanner(QThread):
         if self.isInterruptionRequested():
             return
 
-        songs = []
-        for entry in seen.values():
-            songs.append({
-                "title":            entry.get("title",          "Unknown"),
-                "artist":           entry.get("artist",         "Unknown"),
-                "mapper":           entry.get("mapper",         "Unknown"),
-                "audio":            entry.get("audioFilename",  "audio.mp3"),
-                "audio_path":       entry.get("audioPath",      ""),
-                "audio_hash":       entry.get("audioHash",      ""),
-                "background":       entry.get("backgroundPath") or "",
-                "background_hash":  entry.get("backgroundHash") or "",
-                "length":           0,
-                "osu_file":         "",
-                "folder":           entry.get("audioPath",      ""),
-                "source":           "lazer",
-            })
-
-        self.progress_update.emit(f"[osu!Lazer] 💾 Saving {len(songs)} lazer songs to cache...")
-        save_cache(self.lazer_dir, songs, source="lazer")
-        self.progress_update.emit(f"[osu!Lazer] ✅ Lazer import complete! ({len(songs)} songs)")
-        self.done.emit(songs)
\ No newline at end of file
+        songs = [_entry_to_song(entry) for entry in seen.values()]
+
+        self.progress_update.emit(f"[osu!Lazer] 💾 Syncing {len(songs)} lazer songs with cache...")
+        added, removed = sync_lazer_cache(self.lazer_dir, songs)
+        self.progress_update.emit(
+            f"[osu!Lazer] ✅ Lazer import complete! ({len(songs)} songs, {len(added)} new, {len(removed)} removed)"
+        )
+        if self.full:
+            # A reload rebuilds the library, so it needs every cached lazer song, not just the new ones
+            added = load_cache(self.lazer_dir) or []
+        self.done.emit(added, removed)
\ No newline at end of file
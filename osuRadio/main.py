@@ -28,7 +28,11 @@ setup_logging(BASE_PATH)
 _log_ffmpeg_info()
 
 class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMixin, LibraryMixin, ContextMenuMixin, UpdateMixin):
+    write_done = Signal(object, object)  # (callback, future), delivered on the GUI thread
+
     def __init__(self):  
+        # Schema migrations run while the window is built, the first query waits for them
+        library_store.start_migrations()
         cache_path = Path(tempfile.gettempdir()) / "OsuRadioCache"
         if cache_path.exists():
             try:
@@ -43,6 +47,7 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
         self._path_cache = {}
         self.current_index = 0
         self.media_key_listener = None
+        self.write_done.connect(self._on_write_done)
             
         self.setWindowIcon(QIcon(str(ICON_PATH)))
         
@@ -291,6 +296,15 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
         self.playback_timer.setInterval(100)
         self.playback_timer.timeout.connect(self._tick_seekbar)
         self._playback_start_time = None
+        self._current_play = None
+        self.play_flush_timer = QTimer(self)
+        self.play_flush_timer.setInterval(60000)
+        self.play_flush_timer.timeout.connect(play_recorder.flush)
+        self.play_flush_timer.start()
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.setInterval(300000)
+        self.maintenance_timer.timeout.connect(self._maybe_run_maintenance)
+        self.maintenance_timer.start()
 
         # Drag tracking logic
         self.slider.sliderPressed.connect(lambda: setattr(self, "_user_dragging", True))
@@ -407,7 +421,7 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
             if getattr(self, "lazer_folder", None) and os.path.isdir(self.lazer_folder):
                 self._deferred_autoplay = True
             else:
-                QTimer.singleShot(300, lambda: self.play_song_at_index(0))
+                QTimer.singleShot(300, self._resume_playback)
         video_file = Path(__file__).parent / "Background Video" / "Triangles.mp4"
         if video_file.exists():
             self.video_sink = QVideoSink(self)
@@ -429,96 +443,23 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
         QShortcut(QKeySequence(Qt.Key_MediaPlay),     self, self.play_song)
         QShortcut(QKeySequence(Qt.Key_MediaPause),    self, self.pause_song)
             
-        # Load from cache if available
-        osu_cache = load_cache(self.osu_folder) or []
-        custom_cache = load_cache(BASE_PATH / "custom_songs") or []
-        lazer_cache = load_cache(self.lazer_folder) if getattr(self, "lazer_folder", None) and os.path.isdir(self.lazer_folder or "") else []
-        lazer_cache = [s for s in (lazer_cache or []) if s.get("source") == "lazer"]
-
-        # No dedup needed here since save_cache already handles it
-        # But do a final safety dedup just in case
-        seen_keys = set()
-        combined_cache = []
-        for s in lazer_cache + osu_cache + custom_cache:  # lazer first so it wins
-            key = (s.get("title","").strip().lower(), s.get("artist","").strip().lower())
-            if key not in seen_keys:
-                seen_keys.add(key)
-                combined_cache.append(s)
+        # Draw the list from last session's snapshot when there is one and reload songs.db
+        # behind it. Otherwise one query, already deduplicated across sources; missing
+        # files are checked in the background once the window is up
+        snapshot = None if first_setup else read_snapshot()
+        combined_cache = [] if snapshot else (load_library(self._library_folders()) or [])
         
-        if combined_cache and not first_setup:
-            is_valid, status_msg, missing_songs = validate_cache(self.osu_folder)
-            print(f"[startup] Cache validation: {status_msg}")
-            
-            if is_valid and not missing_songs:
-                print(f"[startup] ✅ Loaded {len(combined_cache)} maps from cache.")
-                self.library = combined_cache
-                self.queue = list(combined_cache)
-                self.populate_list(self.queue)
-                self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-            
-            elif is_valid and missing_songs and len(missing_songs) < len(combined_cache) * 0.3:
-                print(f"[startup] ⚠️ Cache has {len(missing_songs)} missing songs")
-                
-                msg = QMessageBox(self)
-                msg.setIcon(QMessageBox.Question)
-                msg.setWindowTitle("Cache Needs Attention")
-                msg.setText(
-                    f"Your song cache has {len(missing_songs)} missing songs.\n\n"
-                    "Options:\n"
-                    "• Clean Up: Remove missing songs (quick)\n"
-                    "• Full Rescan: Scan entire folder (thorough)\n"
-                    "• Use As-Is: Continue with current cache"
-                )
-                clean_btn = msg.addButton("Clean Up", QMessageBox.AcceptRole)
-                rescan_btn = msg.addButton("Full Rescan", QMessageBox.ActionRole)
-                use_btn = msg.addButton("Use As-Is", QMessageBox.RejectRole)
-                show_modal(msg)
-                
-                clicked = msg.clickedButton()
-                
-                if clicked == clean_btn:
-                    removed = remove_missing_songs(missing_songs)
-                    osu_cache = load_cache(self.osu_folder)
-                    custom_cache = load_cache(BASE_PATH / "custom_songs")
-                    combined_cache = (osu_cache or []) + (custom_cache or [])
-                    if combined_cache:
-                        self.library = combined_cache
-                        self.queue = list(combined_cache)
-                        self.populate_list(self.queue)
-                        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-                        QMessageBox.information(
-                            self, "Cleanup Complete", 
-                            f"Removed {removed} missing songs.\n{len(combined_cache)} songs remaining."
-                        )
-                elif clicked == rescan_btn:
-                    self.reload_songs(force_rescan=True)
-                else:
-                    self.library = combined_cache
-                    self.queue = list(combined_cache)
-                    self.populate_list(self.queue)
-                    self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-            
-            else:
-                print("[startup] ❌ Cache is severely outdated or corrupted")
-                
-                msg = QMessageBox(self)
-                msg.setIcon(QMessageBox.Warning)
-                msg.setWindowTitle("Cache Outdated")
-                msg.setText(
-                    f"{status_msg}\n\n"
-                    "A full rescan is strongly recommended.\n"
-                    "Would you like to scan your songs folder now?"
-                )
-                msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
-                show_modal(msg)
-                
-                if msg.result() == QMessageBox.Yes:
-                    self.reload_songs(force_rescan=True)
-                else:
-                    self.library = combined_cache
-                    self.queue = list(combined_cache)
-                    self.populate_list(self.queue)
-                    self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+        if snapshot:
+            print(f"[startup] ⚡ Showing {len(snapshot)} songs from the snapshot")
+            self._set_library(snapshot)
+            self._restore_queue()
+            QTimer.singleShot(0, self._reload_library_from_cache)
+        
+        elif combined_cache and not first_setup:
+            print(f"[startup] ✅ Loaded {len(combined_cache)} maps from cache.")
+            self._set_library(combined_cache)
+            self._restore_queue()
+            QTimer.singleShot(0, self._check_library_files)
         
         elif first_setup:
             print("[startup] 🛠 First setup, scanning without prompt.")
@@ -551,33 +492,29 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
                         if isinstance(maps, list) and maps:
                             import_progress = QProgressDialog(
                                 "Importing legacy cache...", 
-                                None, 0, len(maps), self
+                                None, 0, 0, self
                             )
                             import_progress.setWindowModality(Qt.ApplicationModal)
                             import_progress.setWindowTitle("osu!Radio - Importing")
                             import_progress.show()
-                            
-                            save_cache(self.osu_folder, maps)
-                            
-                            for i, s in enumerate(maps):
-                                import_progress.setValue(i)
-                                QApplication.processEvents()
-                            
-                            import_progress.close()
-                            json_path.unlink()
-                            
-                            cached = load_cache(self.osu_folder)
-                            if cached:
-                                self.library = cached
-                                self.queue = list(cached)
-                                self.populate_list(self.queue)
-                                self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-                                
+
+                            def imported(future):
+                                import_progress.close()
+                                cached = load_cache(self.osu_folder) if future.exception() is None else None
+                                if not cached:
+                                    print("[startup] Starting full scan...")
+                                    self.reload_songs(force_rescan=True)
+                                    return
+                                json_path.unlink()
+                                self._set_library(cached)
+
                                 QMessageBox.information(
                                     self, "Import Complete",
                                     f"Successfully imported {len(cached)} songs from legacy cache!"
                                 )
-                                return
+
+                            self._when_written(save_cache(self.osu_folder, maps), imported)
+                            return
                     except Exception as e:
                         print(f"[startup] Failed to import from legacy JSON: {e}")
                 
@@ -586,6 +523,11 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
             else:
                 sys.exit()
             
+        # Pick up maps imported into lazer while osu!Radio was closed, then keep watching
+        self._setup_lazer_watcher()
+        if not first_setup and getattr(self, "lazer_folder", None) and os.path.isdir(self.lazer_folder):
+            QTimer.singleShot(3000, self._start_lazer_sync)
+
         self.apply_settings(
             self.osu_folder, self.lazer_folder, self.light_mode, self.ui_opacity,
             w, h, self.hue, self.brightness, self.video_enabled, self.autoplay,
@@ -597,6 +539,13 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
         QTimer.singleShot(0, self.apply_window_flags)
         QTimer.singleShot(0, self._set_dynamic_max_size)
 
+    def _when_written(self, future, callback):
+        # Runs callback(future) on the GUI thread once the database writer is done with it
+        future.add_done_callback(lambda f: self.write_done.emit(callback, f))
+
+    def _on_write_done(self, callback, future):
+        callback(future)
+
     def _get_path(self, song):
         key = (song.get("title"), song.get("artist"))
         if key not in self._path_cache:
@@ -671,6 +620,19 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
             self._scanner.requestInterruption()
             self._scanner.wait(3000)
 
+        if hasattr(self, "_library_loader") and self._library_loader.isRunning():
+            self._library_loader.requestInterruption()
+            self._library_loader.wait(3000)
+        if hasattr(self, "_library_checker") and self._library_checker.isRunning():
+            self._library_checker.requestInterruption()
+            self._library_checker.wait(3000)
+        if hasattr(self, "_hash_worker") and self._hash_worker.isRunning():
+            self._hash_worker.requestInterruption()
+            self._hash_worker.wait(3000)
+        if hasattr(self, "_dup_detector") and self._dup_detector.isRunning():
+            self._dup_detector.requestInterruption()
+            self._dup_detector.wait(3000)
+
         # 1) Unregister global hotkeys
         try:
             if hasattr(self, 'media_key_listener') and self.media_key_listener:
@@ -685,13 +647,16 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
         except:
             pass
 
-        # 3) Stop pitch player and timer
+        # 3) Save the queue and where playback was, then stop pitch player and timer
+        self._save_queue()
         if hasattr(self, "pitch_player"):
             self.pitch_player.stop()
             self.playback_timer.stop()
 
-        # 4) Save settings
+        # 4) Save settings and the library snapshot for the next startup
         self.save_user_settings()
+        if self.library:
+            write_snapshot(snapshot_rows(self.library))
 
         # 5) Clean up temp cache folder
         cache_path = Path(tempfile.gettempdir()) / "OsuRadioCache"
@@ -707,9 +672,17 @@ class MainWindow(QMainWindow, UiMixin, PlayerMixin, SettingsMixin, CustomSongsMi
         event.accept()
 
         # 7) Stop lazer scanner if it's still running
+        if hasattr(self, "_lazer_sync_timer"):
+            self._lazer_sync_timer.stop()
         if hasattr(self, "_lazer_scanner") and self._lazer_scanner.isRunning():
             self._lazer_scanner.requestInterruption()
             self._lazer_scanner.wait(3000)
+
+        # 8) Record the song that was playing, flush queued writes, then close the GUI thread's database connection, checkpointing the WAL
+        self._finish_play()
+        play_recorder.flush()
+        library_store.writer.stop()
+        library_store.close()
         
     def _on_audio_status(self, status):
         # QMediaPlayer.EndOfMedia fires once when a track finishes
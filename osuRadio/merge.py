@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+
+def song_key(song: Dict) -> Tuple[str, str]:
+    return (
+        (song.get("title") or "").strip().lower(),
+        (song.get("artist") or "").strip().lower()
+    )
+
+def song_identity(song: Dict):
+    # Lazer rows share folder/filename across sets, their hash is the stable identity
+    if song.get("source") == "lazer":
+        return ("lazer", song.get("audio_hash") or "")
+    return ("file", song.get("folder", ""), song.get("audio", ""))
+
+def merge_library(*groups: List[Dict]) -> List[Dict]:
+    # Groups are in precedence order: a song is dropped if an earlier song already
+    # claimed its audio hash, its acoustic duplicate cluster or its (title, artist) key.
+    # Single pass, dict lookups only.
+    merged = []
+    by_hash = {}
+    by_cluster = {}
+    by_key = {}
+    for group in groups:
+        for song in group or ():
+            h = song.get("audio_hash")
+            cluster = song.get("dup_cluster")
+            key = song_key(song)
+            if (h and h in by_hash) or (cluster is not None and cluster in by_cluster) or key in by_key:
+                continue
+            if h:
+                by_hash[h] = song
+            if cluster is not None:
+                by_cluster[cluster] = song
+            by_key[key] = song
+            merged.append(song)
+    return merged
+
+def build_song_index(library: List[Dict]) -> Dict:
+    # Resolves a stored row to the library entry that represents it: the same file,
+    # else the same audio, else the same (title, artist) that merge_library kept
+    index = {}
+    for song in library:
+        index.setdefault(song_identity(song), song)
+        if song.get("audio_hash"):
+            index.setdefault(("hash", song["audio_hash"]), song)
+        index.setdefault(("key",) + song_key(song), song)
+    return index
+
+def resolve_song(index: Dict, row: Dict) -> Optional[Dict]:
+    return (
+        index.get(song_identity(row))
+        or (row.get("audio_hash") and index.get(("hash", row["audio_hash"])))
+        or index.get(("key",) + song_key(row))
+    )
+
+def split_by_source(library: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    lazer, other = [], []
+    for song in library:
+        (lazer if song.get("source") == "lazer" else other).append(song)
+    return lazer, other
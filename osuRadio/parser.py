@@ -17,6 +17,7 @@ class OsuParser:
     def parse(path: str) -> dict:
         data = {
             "audio": "", "title": "", "artist": "", "mapper": "",
+            "title_unicode": "", "artist_unicode": "", "map_source": "", "tags": "",
             "background": "", "length": 0,
             "osu_file": path, "folder": str(Path(path).parent)
         }
@@ -28,8 +29,16 @@ class OsuParser:
                 data["title"] = line.split(":", 1)[1].strip()
             elif line.lower().startswith("artist:"):
                 data["artist"] = line.split(":", 1)[1].strip()
+            elif line.lower().startswith("titleunicode:"):
+                data["title_unicode"] = line.split(":", 1)[1].strip()
+            elif line.lower().startswith("artistunicode:"):
+                data["artist_unicode"] = line.split(":", 1)[1].strip()
             elif line.lower().startswith("creator:"):
                 data["mapper"] = line.split(":", 1)[1].strip()
+            elif line.lower().startswith("source:"):
+                data["map_source"] = line.split(":", 1)[1].strip()
+            elif line.lower().startswith("tags:"):
+                data["tags"] = line.split(":", 1)[1].strip()
             elif line.startswith("0,0") and not data["background"]:
                 if bg := re.search(r'0,0,"([^"]+)"', line):
                     data["background"] = bg.group(1)
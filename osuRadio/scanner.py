@@ -1,25 +1,30 @@
 import os
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from PySide6.QtCore import Qt, Signal, QThread, QTimer
+from PySide6.QtCore import Qt, Signal, QThread, QTimer, QFileSystemWatcher
 from PySide6.QtWidgets import QApplication, QLabel, QMessageBox, QProgressDialog
-from osuRadio.config import BASE_PATH, CUSTOM_SONGS_PATH, DATABASE_FILE
-from osuRadio.lazer import LazerScanner, compute_file_hash
+from osuRadio.config import BASE_PATH, CUSTOM_SONGS_PATH
+from osuRadio.merge import merge_library, split_by_source, song_identity, build_song_index, resolve_song
+from osuRadio.snapshot import write_snapshot_async
+from osuRadio.duplicates import DuplicateDetector
+from osuRadio.lazer import LazerScanner, compute_file_hash, compute_file_fingerprint, FINGERPRINT_PREFIX
 from osuRadio.msg import show_modal
 from osuRadio.parser import OsuParser
 from osuRadio.db import (
-    load_cache, save_cache, validate_cache,
-    remove_missing_songs, get_audio_path
+    load_cache, load_library, find_missing_audio, reconcile_cache, validate_cache, init_db,
+    releases_connection, remove_missing_songs, get_cached_hashes, store_file_hashes, run_maintenance,
+    load_playlist, save_playlist, QUEUE_PLAYLIST
 )
 
 class LibraryScanner(QThread):
-    done = Signal(list)
+    done = Signal(list, int)  # (cached songs, beatmaps skipped for missing audio)
     progress_update = Signal(str)
 
     def __init__(self, folder):
         super().__init__()
         self.folder = folder
 
+    @releases_connection
     def run(self):
         uniq = {}
         print(f"[LibraryScanner] Starting scan for folder: {self.folder}")
@@ -84,49 +89,393 @@ class LibraryScanner(QThread):
         if skipped_no_audio > 0:
             print(f"[LibraryScanner] Skipped {skipped_no_audio} beatmaps with missing/no audio files.")
         
-        save_cache(self.folder, library)
+        reconcile_cache(self.folder, library)
+        # Hand back the cached rows rather than the raw parse, so hashes and track grouping carry over
+        library = load_cache(self.folder) or []
         
         if self.isInterruptionRequested():
             print("[LibraryScanner] Interruption requested before emitting 'done' signal.")
             return
 
         self.progress_update.emit(f"[osu!Stable] ✅ Import complete! ({len(library)} beatmaps)")
-        self.done.emit(library)
+        self.done.emit(library, skipped_no_audio)
         print("[LibraryScanner] 'done' signal emitted.")
 
+class LibraryLoadWorker(QThread):
+    done = Signal(list)
+
+    def __init__(self, folders):
+        super().__init__()
+        self.folders = folders
+
+    @releases_connection
+    def run(self):
+        library = load_library(self.folders) or []
+        if not self.isInterruptionRequested():
+            self.done.emit(library)
+
+class LibraryCheckWorker(QThread):
+    # Existence checks for a library that was loaded straight from the cache
+    done = Signal(bool, str, list, list)  # is_valid, status_msg, missing_songs, missing_audio
+
+    def __init__(self, osu_folder, songs):
+        super().__init__()
+        self.osu_folder = osu_folder
+        self.songs = list(songs)
+
+    @releases_connection
+    def run(self):
+        missing_audio = find_missing_audio(self.songs)
+        if self.isInterruptionRequested():
+            return
+        is_valid, status_msg, missing_songs = validate_cache(self.osu_folder)
+        if self.isInterruptionRequested():
+            return
+        self.done.emit(is_valid, status_msg, missing_songs, missing_audio)
+
+class HashBackfillWorker(QThread):
+    done = Signal(dict)  # {(folder, audio): audio_hash}
+    progress_update = Signal(str)
+
+    BATCH_SIZE = 64
+
+    def __init__(self, songs, lazer_songs=()):
+        super().__init__()
+        # Plain tuples only, the song dicts stay on the GUI thread
+        self.current = {(s.get("folder", ""), s.get("audio", "")): s.get("audio_hash") for s in songs}
+        self.targets = list(self.current)
+        self.lazer_files = list({
+            (os.path.join(s.get("folder", ""), s["audio_hash"]), s["audio_hash"])
+            for s in lazer_songs if s.get("audio_hash")
+        })
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _run_batched(self, pool, func, items, label):
+        # Yields (item, result) per batch so results can be written as they arrive
+        for i in range(0, len(items), self.BATCH_SIZE):
+            if self.isInterruptionRequested():
+                print("[HashBackfill] Interruption requested, stopping.")
+                return
+            batch = items[i:i + self.BATCH_SIZE]
+            yield list(zip(batch, pool.map(func, [b["path"] for b in batch])))
+            self.progress_update.emit(f"[HashBackfill] {label} {min(i + self.BATCH_SIZE, len(items))}/{len(items)}")
+
+    @releases_connection
+    def run(self):
+        init_db()
+        entries = []
+        for folder, audio in self.targets:
+            path = os.path.join(folder, audio)
+            st = self._stat(path)
+            if st:
+                entries.append({"path": path, "stat": st, "key": (folder, audio)})
+        for path, sha in self.lazer_files:
+            st = self._stat(path)
+            if st:
+                entries.append({"path": path, "stat": st, "sha": sha})
+        if self.isInterruptionRequested():
+            return
+
+        cached = get_cached_hashes([(e["path"], *e["stat"]) for e in entries])
+        for e in entries:
+            fingerprint, sha = cached.get(e["path"], (None, None))
+            # Fingerprints from an older block size get recomputed, full hashes stay valid
+            e["fingerprint"] = fingerprint if fingerprint and fingerprint.startswith(FINGERPRINT_PREFIX) else None
+            e.setdefault("sha", sha)
+
+        workers = min(4, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Stage 1: sampled-block fingerprints
+            pending = [e for e in entries if not e["fingerprint"]]
+            print(f"[HashBackfill] {len(entries) - len(pending)} fingerprints cached, {len(pending)} to compute")
+            for batch in self._run_batched(pool, compute_file_fingerprint, pending, "Fingerprinted"):
+                rows = []
+                for e, fingerprint in batch:
+                    e["fingerprint"] = fingerprint
+                    if fingerprint:
+                        rows.append((e["path"], *e["stat"], fingerprint, e["sha"]))
+                store_file_hashes(rows, [])
+            if self.isInterruptionRequested():
+                return
+
+            groups = {}
+            for e in entries:
+                if e["fingerprint"]:
+                    groups.setdefault(e["fingerprint"], []).append(e)
+
+            # Stage 2: full SHA-256 only for stable files that share a fingerprint with another file
+            pending = [
+                e for e in entries
+                if "key" in e and not e["sha"] and len(groups.get(e["fingerprint"], ())) > 1
+            ]
+            print(f"[HashBackfill] {len(pending)} fingerprint collisions need a full hash")
+            for batch in self._run_batched(pool, compute_file_hash, pending, "Hashed"):
+                rows = []
+                for e, sha in batch:
+                    if sha:
+                        e["sha"] = sha
+                        rows.append((e["path"], *e["stat"], e["fingerprint"], sha))
+                store_file_hashes(rows, [])
+            if self.isInterruptionRequested():
+                return
+
+        results = {}
+        for e in entries:
+            if "key" not in e or not e["fingerprint"]:
+                continue
+            if len(groups[e["fingerprint"]]) > 1 and e["sha"]:
+                results[e["key"]] = e["sha"]
+            else:
+                # Unique content, the fingerprint is identity enough until something collides with it
+                results[e["key"]] = f"fp:{e['fingerprint']}"
+
+        # Only hashes that changed are written, an unchanged library costs no song writes
+        results = {key: h for key, h in results.items() if h != self.current.get(key)}
+        if results:
+            store_file_hashes([], [(h, folder, audio) for (folder, audio), h in results.items()])
+        self.done.emit(results)
+
 class LibraryMixin:
-    def _on_lazer_scan_complete(self, lazer_songs):
+    def _library_folders(self):
+        # Precedence order for load_library: lazer wins, then stable, then custom songs
+        lazer_folder = getattr(self, "lazer_folder", None)
+        return [
+            lazer_folder if lazer_folder and os.path.isdir(lazer_folder) else None,
+            self.osu_folder,
+            CUSTOM_SONGS_PATH,
+        ]
+
+    def _replace_library(self, library):
+        # Every change to self.library goes through here so the identity index is rebuilt
+        self.library = library
+        self._identity_index = None
+
+    def _set_library(self, library):
+        self._replace_library(library)
+        self.queue = list(library)
+        self.populate_list(self.queue)
+        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+        self._schedule_snapshot()
+
+    def _schedule_snapshot(self):
+        # Library changes come in bursts (scan, merge, backfill), write once they settle
+        if not hasattr(self, "_snapshot_timer"):
+            self._snapshot_timer = QTimer(self)
+            self._snapshot_timer.setSingleShot(True)
+            self._snapshot_timer.setInterval(5000)
+            self._snapshot_timer.timeout.connect(lambda: write_snapshot_async(self.library))
+        self._snapshot_timer.start()
+
+    def _drop_song_rows(self, row_ids):
+        # Removes tombstoned rows from the library in place: a track loses those maps and
+        # goes away once it has none left
+        gone = set(row_ids)
+        current_song = self.queue[self.current_index] if self.current_index < len(self.queue) else None
+        library = []
+        for song in self.library:
+            maps = song.get("maps")
+            if maps is None:
+                if song.get("id") not in gone:
+                    library.append(song)
+                continue
+            kept = [m for m in maps if m.get("id") not in gone]
+            if not kept:
+                continue
+            if len(kept) != len(maps):
+                song["maps"] = kept
+                if song.get("id") in gone:
+                    song.update(kept[0])
+            library.append(song)
+        print(f"[library] Dropped {len(self.library) - len(library)} songs for {len(gone)} missing rows")
+        self._replace_library(library)
+        self._sync_queue_to_library(current_song)
+
+    def _apply_saved_queue(self, song_ids, index):
+        # Puts the saved songs first, in their saved order, and the rest of the library
+        # after them. Returns the song the saved index points at, if it is still around
+        by_id = {}
+        for song in self.library:
+            by_id.setdefault(song.get("id"), song)
+            for m in song.get("maps") or ():
+                by_id.setdefault(m.get("id"), song)
+        self.queue = []
+        seen = set()
+        for song_id in song_ids:
+            song = by_id.get(song_id)
+            if song is not None and id(song) not in seen:
+                seen.add(id(song))
+                self.queue.append(song)
+        current_song = by_id.get(song_ids[index]) if 0 <= index < len(song_ids) else None
+        self.current_index = 0
+        self._sync_queue_to_library(current_song)
+        return current_song
+
+    def _restore_queue(self):
+        saved = load_playlist(QUEUE_PLAYLIST)
+        if not saved or not self.library:
+            return
+        song_ids, index, position_ms = saved
+        current_song = self._apply_saved_queue(song_ids, index)
+        if current_song is None:
+            return
+        self._resume_position_ms = position_ms
+        self.song_list.setCurrentRow(self.current_index)
+        self.now_lbl.setText(f"{current_song.get('title','')} — {current_song.get('artist','')}")
+        print(f"[queue] Restored {len(song_ids)} songs, resuming at #{self.current_index}")
+
+    def _queue_state(self):
+        # (song ids, index of the current song among them, position in ms)
+        song_ids, index, skipped = [], 0, 0
+        for i, song in enumerate(self.queue):
+            if song.get("id") is None:
+                skipped += 1
+                continue
+            if i == self.current_index:
+                index = len(song_ids)
+            song_ids.append(song["id"])
+        if skipped:
+            print(f"[queue] {skipped} songs have no row in songs.db yet and are left out of the saved queue")
+        if getattr(self, "_current_play", None) is not None or getattr(self, "is_playing", False):
+            position_ms = self.slider.value()
+        else:
+            position_ms = getattr(self, "_resume_position_ms", None) or 0
+        return song_ids, index, position_ms
+
+    def _save_queue(self):
+        if self.queue:
+            save_playlist(QUEUE_PLAYLIST, *self._queue_state())
+
+    def _maybe_run_maintenance(self):
+        # Only while nothing is playing and no worker is writing to songs.db
+        if getattr(self, "is_playing", False):
+            return
+        workers = ("_scanner", "_lazer_scanner", "_hash_worker", "_dup_detector", "_library_loader")
+        if any(hasattr(self, name) and getattr(self, name).isRunning() for name in workers):
+            return
+        run_maintenance()
+
+    def _reload_library_from_cache(self):
+        # The list on screen came from the snapshot, swap in the real rows from songs.db
+        self._library_loader = LibraryLoadWorker(self._library_folders())
+        self._library_loader.done.connect(self._on_library_loaded)
+        self._library_loader.start()
+
+    def _on_library_loaded(self, library):
+        if not library:
+            print("[startup] songs.db returned no songs, keeping the snapshot")
+            return
+        index = build_song_index(library)
+        current_song = self.queue[self.current_index] if self.current_index < len(self.queue) else None
+        queue, seen = [], set()
+        for song in self.queue:
+            resolved = resolve_song(index, song)
+            if resolved is not None and id(resolved) not in seen:
+                seen.add(id(resolved))
+                queue.append(resolved)
+        print(f"[startup] Reloaded {len(library)} songs from songs.db")
+        self._replace_library(library)
+        self.queue = queue
+        self._sync_queue_to_library(current_song and resolve_song(index, current_song))
+        self._check_library_files()
+
+    def _check_library_files(self):
+        if hasattr(self, "_library_checker") and self._library_checker.isRunning():
+            return
+        self._library_checker = LibraryCheckWorker(self.osu_folder, self.library)
+        self._library_checker.done.connect(self._on_library_checked)
+        self._library_checker.start()
+
+    def _on_library_checked(self, is_valid, status_msg, missing_songs, missing_audio):
+        print(f"[startup] Cache validation: {status_msg}")
+        if missing_audio:
+            print(f"[startup] Dropping {len(missing_audio)} songs whose audio is gone")
+            gone = {id(s) for s in missing_audio}
+            current_song = self.queue[self.current_index] if self.current_index < len(self.queue) else None
+            self._replace_library([s for s in self.library if id(s) not in gone])
+            self._sync_queue_to_library(current_song)
+
+        if is_valid and not missing_songs:
+            return
+
+        if is_valid and len(missing_songs) < len(self.library) * 0.3:
+            print(f"[startup] ⚠️ Cache has {len(missing_songs)} missing songs")
+            
+            msg = QMessageBox(self)
+            msg.setIcon(QMessageBox.Question)
+            msg.setWindowTitle("Cache Needs Attention")
+            msg.setText(
+                f"Your song cache has {len(missing_songs)} missing songs.\n\n"
+                "Options:\n"
+                "• Clean Up: Remove missing songs (quick)\n"
+                "• Full Rescan: Scan entire folder (thorough)\n"
+                "• Use As-Is: Continue with current cache"
+            )
+            clean_btn = msg.addButton("Clean Up", QMessageBox.AcceptRole)
+            rescan_btn = msg.addButton("Full Rescan", QMessageBox.ActionRole)
+            msg.addButton("Use As-Is", QMessageBox.RejectRole)
+            show_modal(msg)
+            
+            clicked = msg.clickedButton()
+            
+            if clicked == clean_btn:
+                def cleaned(future):
+                    removed = future.result() if future.exception() is None else 0
+                    self._drop_song_rows(s["id"] for s in missing_songs)
+                    QMessageBox.information(
+                        self, "Cleanup Complete", 
+                        f"Removed {removed} missing songs.\n{len(self.library)} songs remaining."
+                    )
+
+                self._when_written(remove_missing_songs(missing_songs), cleaned)
+            elif clicked == rescan_btn:
+                self.reload_songs(force_rescan=True)
+            return
+
+        print("[startup] ❌ Cache is severely outdated or corrupted")
+        
+        msg = QMessageBox(self)
+        msg.setIcon(QMessageBox.Warning)
+        msg.setWindowTitle("Cache Outdated")
+        msg.setText(
+            f"{status_msg}\n\n"
+            "A full rescan is strongly recommended.\n"
+            "Would you like to scan your songs folder now?"
+        )
+        msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        show_modal(msg)
+        
+        if msg.result() == QMessageBox.Yes:
+            self.reload_songs(force_rescan=True)
+
+    def _merge_lazer_changes(self, lazer_songs, removed_hashes):
+        library = self.library
+        if removed_hashes:
+            gone = set(removed_hashes)
+            library = [
+                s for s in library
+                if not (s.get("source") == "lazer" and s.get("audio_hash") in gone)
+            ]
+
+        # New lazer rows take precedence over whatever they duplicate by hash or title/artist
+        before = len(library)
+        self._replace_library(merge_library(lazer_songs, library))
+        replaced = before + len(lazer_songs) - len(self.library)
+
+        print(f"[LazerScan] Merged: {len(lazer_songs) - replaced} new, {replaced} replaced dupes, {len(removed_hashes)} removed")
+
+    def _on_lazer_scan_complete(self, lazer_songs, removed_hashes=()):
+        # lazer_songs is the whole cached lazer library, it replaces whatever lazer songs were loaded
         self._lazer_scan_pending = False
         print(f"[LazerMerge] Starting with library size: {len(self.library)}")
         print(f"[LazerScan] Got {len(lazer_songs)} songs from lazer")
-        existing_hashes = {s.get("audio_hash") for s in self.library if s.get("audio_hash")}
-        existing_keys = {
-            (s.get("title", "").strip().lower(), s.get("artist", "").strip().lower())
-            for s in self.library
-        }
-
-        added = 0
-        replaced = 0
-        for song in lazer_songs:
-            h = song.get("audio_hash")
-            key = (song.get("title", "").strip().lower(), song.get("artist", "").strip().lower())
-            if h and h in existing_hashes:
-                self.library = [s for s in self.library if s.get("audio_hash") != h]
-                self.library.append(song)
-                replaced += 1
-            elif key in existing_keys:
-                self.library = [
-                    s for s in self.library
-                    if (s.get("title", "").strip().lower(), s.get("artist", "").strip().lower()) != key
-                ]
-                self.library.append(song)
-                replaced += 1
-            else:
-                self.library.append(song)
-                existing_keys.add(key)
-                added += 1
-
-        print(f"[LazerScan] Merged: {added} new, {replaced} replaced stable dupes")
+        _, other = split_by_source(self.library)
+        self._replace_library(merge_library(lazer_songs, other))
         
         QTimer.singleShot(500, self._backfill_stable_hashes)
         self._lazer_scan_done = True
@@ -139,7 +488,7 @@ class LibraryMixin:
         if getattr(self, "_deferred_autoplay", False):
             self._deferred_autoplay = False
             if self.queue:
-                self.play_song_at_index(0)
+                self._resume_playback()
 
         if hasattr(self, "current_index") and self.queue:
             current_song = self.queue[self.current_index] if self.current_index < len(self.queue) else None
@@ -150,30 +499,139 @@ class LibraryMixin:
                     self.play_song_at_index(self.current_index)
                     QTimer.singleShot(300, lambda: self.seek(current_pos))
 
+    def _setup_lazer_watcher(self):
+        if not hasattr(self, "_lazer_watcher"):
+            self._lazer_watcher = QFileSystemWatcher(self)
+            self._lazer_watcher.fileChanged.connect(self._on_lazer_realm_changed)
+            # lazer writes client.realm in bursts, wait for it to settle before syncing
+            self._lazer_sync_timer = QTimer(self)
+            self._lazer_sync_timer.setSingleShot(True)
+            self._lazer_sync_timer.setInterval(10000)
+            self._lazer_sync_timer.timeout.connect(self._start_lazer_sync)
+
+        watched = self._lazer_watcher.files()
+        if watched:
+            self._lazer_watcher.removePaths(watched)
+
+        lazer_folder = getattr(self, "lazer_folder", None)
+        if lazer_folder and os.path.isdir(lazer_folder):
+            realm_path = os.path.join(lazer_folder, "client.realm")
+            if os.path.isfile(realm_path):
+                self._lazer_watcher.addPath(realm_path)
+                print(f"[LazerWatcher] Watching {realm_path}")
+
+    def _on_lazer_realm_changed(self, path):
+        # Realm can replace the file (compaction), which drops it from the watch list
+        if path not in self._lazer_watcher.files() and os.path.isfile(path):
+            self._lazer_watcher.addPath(path)
+        self._lazer_sync_timer.start()
+
+    def _start_lazer_sync(self):
+        scanning = (
+            (hasattr(self, "_scanner") and self._scanner.isRunning())
+            or (hasattr(self, "_library_loader") and self._library_loader.isRunning())
+            or (hasattr(self, "_lazer_scanner") and self._lazer_scanner.isRunning())
+        )
+        if scanning:
+            self._lazer_sync_timer.start()
+            return
+
+        print("[LazerWatcher] client.realm changed, syncing lazer library...")
+        self._lazer_scanner = LazerScanner(self.lazer_folder)
+        self._lazer_scanner.progress_update.connect(lambda msg: print(msg))
+        self._lazer_scanner.done.connect(self._on_lazer_sync_complete)
+        self._lazer_scanner.start()
+
+    def _on_lazer_sync_complete(self, lazer_songs, removed_hashes):
+        if lazer_songs or removed_hashes:
+            self._apply_lazer_sync(lazer_songs, removed_hashes)
+
+        if getattr(self, "_deferred_autoplay", False):
+            self._deferred_autoplay = False
+            if self.queue:
+                self._resume_playback()
+
+    def _apply_lazer_sync(self, lazer_songs, removed_hashes):
+        current_song = self.queue[self.current_index] if self.current_index < len(self.queue) else None
+        self._merge_lazer_changes(lazer_songs, removed_hashes)
+        self._sync_queue_to_library(current_song)
+
+    def _sync_queue_to_library(self, current_song):
+        in_library = {id(s) for s in self.library}
+        queued = {id(s) for s in self.queue}
+        self.queue = [s for s in self.queue if id(s) in in_library]
+        self.queue.extend(s for s in self.library if id(s) not in queued)
+        if current_song is not None and id(current_song) in in_library:
+            self.current_index = self.queue.index(current_song)
+        elif self.current_index >= len(self.queue):
+            self.current_index = 0
+
+        if not self.search.text().strip():
+            self.populate_list(self.queue)
+        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+        self._schedule_snapshot()
+
     def _backfill_stable_hashes(self):
-        needs_hash = [s for s in self.library if s.get("source") != "lazer" and not s.get("audio_hash")]
+        if hasattr(self, "_hash_worker") and self._hash_worker.isRunning():
+            return
+        # "fp:" hashes were unique by fingerprint last time, re-check them in case a twin appeared
+        needs_hash = [
+            s for s in self.library
+            if s.get("source") != "lazer" and (not s.get("audio_hash") or s["audio_hash"].startswith("fp:"))
+        ]
         if not needs_hash:
+            self._detect_duplicates()
             return
+        lazer_songs = [s for s in self.library if s.get("source") == "lazer"]
 
-        print(f"[HashBackfill] Computing hashes for {len(needs_hash)} stable songs...")
+        print(f"[HashBackfill] Fingerprinting {len(needs_hash)} stable songs against {len(lazer_songs)} lazer songs...")
+        self._hash_worker = HashBackfillWorker(needs_hash, lazer_songs)
+        self._hash_worker.progress_update.connect(lambda msg: print(msg))
+        self._hash_worker.done.connect(self._on_hashes_backfilled)
+        self._hash_worker.start()
+
+    def _on_hashes_backfilled(self, hashes):
+        applied = 0
+        for song in self.library:
+            if song.get("source") == "lazer":
+                continue
+            current = song.get("audio_hash")
+            if current and not current.startswith("fp:"):
+                continue
+            h = hashes.get((song.get("folder", ""), song.get("audio", "")))
+            if h and h != current:
+                song["audio_hash"] = h
+                applied += 1
+        print(f"[HashBackfill] Done. {applied} hashes applied.")
+
+        if applied:
+            # Backfilled hashes can reveal stable copies of lazer audio under a different title
+            self._remerge_library("HashBackfill")
+        self._detect_duplicates()
+
+    def _remerge_library(self, tag):
+        lazer_songs, other = split_by_source(self.library)
+        merged = merge_library(lazer_songs, other)
+        collapsed = len(self.library) - len(merged)
+        current_song = self.queue[self.current_index] if self.current_index < len(self.queue) else None
+        # Backfilled hashes and clusters changed songs in place, so replace it either way
+        self._replace_library(merged)
+        if collapsed:
+            print(f"[{tag}] Collapsed {collapsed} duplicate songs")
+            self._sync_queue_to_library(current_song)
+
+    def _detect_duplicates(self):
+        if hasattr(self, "_dup_detector") and self._dup_detector.isRunning():
+            return
+        self._dup_detector = DuplicateDetector()
+        self._dup_detector.progress_update.connect(lambda msg: print(msg))
+        self._dup_detector.done.connect(self._on_duplicates_detected)
+        self._dup_detector.start()
 
-        try:
-            with sqlite3.connect(DATABASE_FILE) as conn:
-                cursor = conn.cursor()
-                for song in needs_hash:
-                    path = get_audio_path(song)
-                    if path.exists():
-                        h = compute_file_hash(str(path))
-                        if h:
-                            cursor.execute(
-                                "UPDATE songs SET audio_hash = ? WHERE title = ? AND artist = ? AND source = 'stable'",
-                                (h, song.get("title"), song.get("artist"))
-                            )
-                            song["audio_hash"] = h
-                conn.commit()
-            print("[HashBackfill] Done.")
-        except Exception as e:
-            print(f"[HashBackfill] Error: {e}")
+    def _on_duplicates_detected(self, clusters):
+        for song in self.library:
+            song["dup_cluster"] = clusters.get(song_identity(song))
+        self._remerge_library("DuplicateDetector")
 
     def _make_progress_dialog(self, reason):
         self.progress = QProgressDialog("Scanning...", None, 0, 0, self)
@@ -246,24 +704,19 @@ class LibraryMixin:
                 clicked = msg.clickedButton()
                 
                 if clicked == clean_btn:
-                    removed = remove_missing_songs(missing_songs)
-                    osu_cache = load_cache(self.osu_folder)
-                    custom_cache = load_cache(BASE_PATH / "custom_songs")
-                    combined_cache = (osu_cache or []) + (custom_cache or [])
-                    
-                    if combined_cache:
-                        self.library = combined_cache
-                        self.queue = list(combined_cache)
-                        self.populate_list(self.queue)
-                        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-                        
+                    def cleaned(future):
+                        removed = future.result() if future.exception() is None else 0
+                        self._drop_song_rows(s["id"] for s in missing_songs)
+
                         QMessageBox.information(
                             self,
                             "Cleanup Complete",
                             f"Removed {removed} missing song(s) from cache.\n"
-                            f"Library now has {len(combined_cache)} songs."
+                            f"Library now has {len(self.library)} songs."
                         )
-                        return
+
+                    self._when_written(remove_missing_songs(missing_songs), cleaned)
+                    return
                         
                 elif clicked == rescan_btn:
                     print("[reload_songs] User requested full rescan")
@@ -276,7 +729,7 @@ class LibraryMixin:
                 print("[reload_songs] Cache is valid, loading from cache")
                 osu_cache = load_cache(self.osu_folder)
                 custom_cache = load_cache(BASE_PATH / "custom_songs")
-                combined_cache = (osu_cache or []) + (custom_cache or [])
+                combined_cache = merge_library(osu_cache, custom_cache)
                 
                 if combined_cache:
                     msg = QMessageBox(self)
@@ -293,7 +746,7 @@ class LibraryMixin:
                         print("[reload_songs] User requested force rescan despite valid cache")
                     else:
                         if not self.library:
-                            self.library = combined_cache
+                            self._replace_library(combined_cache)
                             self.queue = list(combined_cache)
                         else:
                             self.queue = list(self.library)
@@ -322,13 +775,6 @@ class LibraryMixin:
         else:
             rescan_reason = "Full rescan requested" if force_rescan else status_msg
 
-        if DATABASE_FILE.exists():
-            try:
-                DATABASE_FILE.unlink()
-                print("[reload_songs] 🗑️ Deleted songs.db for fresh rescan.")
-            except Exception as e:
-                print(f"[reload_songs] Failed to delete songs.db: {e}")
-
         self._make_progress_dialog(rescan_reason)
 
         if has_real_stable:
@@ -340,7 +786,7 @@ class LibraryMixin:
             self._stable_reload_result = ([], 0, 0)
 
         if self._lazer_scan_pending:
-            self._lazer_scanner = LazerScanner(self.lazer_folder)
+            self._lazer_scanner = LazerScanner(self.lazer_folder, full=True)
             self._lazer_scanner.progress_update.connect(self._on_progress_update)
             self._lazer_scanner.done.connect(self._on_lazer_scan_complete)
             self._lazer_scanner.start()
@@ -349,18 +795,8 @@ class LibraryMixin:
         if hasattr(self, "progress_label") and self.progress_label:
             self.progress_label.setText(text)
 
-    def _on_reload_complete(self, library):
-        valid_library = []
-        missing_count = 0
-        
-        for song in library:
-            audio_path = Path(song.get("folder", "")) / song.get("audio", "")
-            if audio_path.exists():
-                valid_library.append(song)
-            else:
-                missing_count += 1
-        
-        library = valid_library
+    def _on_reload_complete(self, library, missing_count):
+        # load_cache already dropped rows whose audio is gone, on the scanner thread
         if missing_count > 0:
             print(f"[reload_complete] ⚠️ Found {len(library)} beatmaps, but {missing_count} have missing audio files")
         else:
@@ -375,35 +811,31 @@ class LibraryMixin:
 
     def _finalize_library(self, stable_library, osu_count, missing_count):
         CUSTOM_SONGS_PATH = BASE_PATH / "custom_songs"
-        custom_count = 0
+        custom_cache = []
         if CUSTOM_SONGS_PATH.exists() and any(CUSTOM_SONGS_PATH.iterdir()):
             self._on_progress_update("📥 Scanning custom songs folder...")
             print("[finalize] 📥 Scanning custom_songs folder...")
-            custom_cache = load_cache(CUSTOM_SONGS_PATH)
+            custom_cache = load_cache(CUSTOM_SONGS_PATH) or []
             if not custom_cache:
                 print("[finalize] Importing custom audio files...")
-                self.import_custom_audio(CUSTOM_SONGS_PATH)
-                custom_cache = load_cache(CUSTOM_SONGS_PATH)
-            stable_library = stable_library + (custom_cache or [])
-            custom_count = len(custom_cache or [])
+                written = self.import_custom_audio(CUSTOM_SONGS_PATH)
+                if written is not None:
+                    # Imported rows come back grouped and with row ids once they are in songs.db
+                    self._when_written(written, lambda _: self._complete_library(
+                        stable_library, load_cache(CUSTOM_SONGS_PATH) or [], osu_count, missing_count
+                    ))
+                    return
+        self._complete_library(stable_library, custom_cache, osu_count, missing_count)
+
+    def _complete_library(self, stable_library, custom_cache, osu_count, missing_count):
+        stable_library = stable_library + custom_cache
+        custom_count = len(custom_cache)
 
         # Merge lazer on top
-        combined_library = stable_library
-        lazer_songs = [s for s in self.library if s.get("source") == "lazer"]
-        if lazer_songs:
-            lazer_keys = {
-                (s.get("title", "").strip().lower(), s.get("artist", "").strip().lower())
-                for s in lazer_songs
-            }
-            combined_library = [
-                s for s in stable_library
-                if (s.get("title", "").strip().lower(), s.get("artist", "").strip().lower()) not in lazer_keys
-            ] + lazer_songs
-
-        self.library = combined_library
-        self.queue = list(combined_library)
-        self.populate_list(self.queue)
-        self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+        lazer_songs, _ = split_by_source(self.library)
+        combined_library = merge_library(lazer_songs, stable_library)
+
+        self._set_library(combined_library)
         print(f"[finalize] ✅ Total: {len(combined_library)} songs in library.")
 
         if hasattr(self, "progress") and self.progress:
@@ -431,13 +863,10 @@ class LibraryMixin:
             print(f"[check_and_update_cache] {status_msg}")
             osu_cache = load_cache(self.osu_folder)
             custom_cache = load_cache(BASE_PATH / "custom_songs")
-            combined_cache = (osu_cache or []) + (custom_cache or [])
+            combined_cache = merge_library(osu_cache, custom_cache)
             
             if combined_cache:
-                self.library = combined_cache
-                self.queue = list(combined_cache)
-                self.populate_list(self.queue)
-                self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
+                self._set_library(combined_cache)
                 print(f"[check_and_update_cache] Loaded {len(combined_cache)} songs from cache")
                 return True
         
@@ -461,18 +890,13 @@ class LibraryMixin:
             choice = msg.result()
             
             if choice == 0:
-                removed = remove_missing_songs(missing_songs)
-                osu_cache = load_cache(self.osu_folder)
-                custom_cache = load_cache(BASE_PATH / "custom_songs")
-                combined_cache = (osu_cache or []) + (custom_cache or [])
-                
-                if combined_cache:
-                    self.library = combined_cache
-                    self.queue = list(combined_cache)
-                    self.populate_list(self.queue)
-                    self.queue_lbl.setText(f"Queue: {len(self.queue)} songs")
-                    print(f"[check_and_update_cache] Cleaned cache: removed {removed}, kept {len(combined_cache)}")
-                    return True
+                def cleaned(future):
+                    removed = future.result() if future.exception() is None else 0
+                    self._drop_song_rows(s["id"] for s in missing_songs)
+                    print(f"[check_and_update_cache] Cleaned cache: removed {removed}, kept {len(self.library)}")
+
+                self._when_written(remove_missing_songs(missing_songs), cleaned)
+                return True
             elif choice == 1:
                 self.reload_songs(force_rescan=True)
                 return True
@@ -306,6 +306,7 @@ class SettingsMixin:
         if lazer_folder != self.lazer_folder and os.path.isdir(lazer_folder):
             self.lazer_folder = lazer_folder
             self.reload_songs()
+            self._setup_lazer_watcher()
 
         self._apply_ui_settings(light, opacity, w, h, hue, brightness)
         self._apply_video_setting(video_on)
@@ -0,0 +1,97 @@
+import os
+import sys
+import struct
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+from osuRadio.config import SNAPSHOT_FILE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# What the window needs to show and play the library before songs.db is read.
+# Everything else (bpm, beatmap ids, the per-track map list) arrives with the
+# background reload from the database.
+TEXT_COLUMNS = ("title", "artist", "mapper", "audio", "background", "osu_file", "folder", "source", "audio_hash")
+INT_COLUMNS = ("id", "length", "track_id", "dup_cluster")
+
+MAGIC = b"ORSNAP2\n"
+_NONE = -1  # ids, lengths and clusters are never negative, so -1 stands for None
+_write_lock = threading.Lock()
+
+def _encode(rows: List[List]) -> bytes:
+    # Columnar: one NUL-joined utf-8 blob per text column, one int64 array per int column
+    out = [struct.pack("<I", len(rows))]
+    for n, _ in enumerate(TEXT_COLUMNS):
+        blob = "\0".join((row[n] or "").replace("\0", "") for row in rows).encode("utf-8")
+        out.append(struct.pack("<I", len(blob)))
+        out.append(blob)
+    offset = len(TEXT_COLUMNS)
+    for n, _ in enumerate(INT_COLUMNS):
+        values = array("q", (_NONE if row[offset + n] is None else int(row[offset + n]) for row in rows))
+        if sys.byteorder == "big":
+            values.byteswap()
+        out.append(values.tobytes())
+    return b"".join(out)
+
+def _decode(payload: bytes) -> List[Dict]:
+    count, = struct.unpack_from("<I", payload, 0)
+    pos = 4
+    columns = {}
+    for name in TEXT_COLUMNS:
+        size, = struct.unpack_from("<I", payload, pos)
+        pos += 4
+        values = payload[pos:pos + size].decode("utf-8").split("\0") if count else []
+        pos += size
+        if len(values) != count:
+            raise ValueError(f"column {name} has {len(values)} values, expected {count}")
+        columns[name] = values
+    for name in INT_COLUMNS:
+        values = array("q")
+        values.frombytes(payload[pos:pos + 8 * count])
+        pos += 8 * count
+        if sys.byteorder == "big":
+            values.byteswap()
+        if len(values) != count:
+            raise ValueError(f"column {name} is truncated")
+        values = values.tolist()
+        columns[name] = [None if v == _NONE else v for v in values] if _NONE in values else values
+
+    names = TEXT_COLUMNS + INT_COLUMNS
+    return [dict(zip(names, row)) for row in zip(*(columns[name] for name in names))]
+
+def snapshot_rows(library: List[Dict]) -> List[List]:
+    # Copied on the calling thread, the library dicts keep changing after this
+    return [[song.get(c) for c in TEXT_COLUMNS + INT_COLUMNS] for song in library]
+
+def write_snapshot(rows: List[List], path: Path = SNAPSHOT_FILE):
+    if zstandard is None:
+        return
+    try:
+        data = MAGIC + zstandard.ZstdCompressor(level=3).compress(_encode(rows))
+        with _write_lock:
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+    except Exception as e:
+        print(f"[snapshot] Failed to write {path}: {e}")
+
+def write_snapshot_async(library: List[Dict], path: Path = SNAPSHOT_FILE):
+    threading.Thread(target=write_snapshot, args=(snapshot_rows(library), path), daemon=True).start()
+
+def read_snapshot(path: Path = SNAPSHOT_FILE) -> Optional[List[Dict]]:
+    if zstandard is None or not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            return None
+        return _decode(zstandard.ZstdDecompressor().decompress(data[len(MAGIC):])) or None
+    except Exception as e:
+        print(f"[snapshot] Ignoring unreadable {path}: {e}")
+        return None
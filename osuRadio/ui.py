@@ -13,6 +13,8 @@ from PySide6.QtWidgets import (
     QSizePolicy, QToolTip
 )
 from osuRadio.config import IMG_PATH
+from osuRadio.db import search_songs
+from osuRadio.merge import build_song_index, resolve_song
 
 class MarqueeLabel(QLabel):
     def __init__(self, *args):
@@ -127,14 +129,33 @@ class UiMixin:
             item.setData(Qt.UserRole, song)
             self.song_list.addItem(item)
 
+    def _library_by_identity(self):
+        # Built on first use, _replace_library clears it whenever the library changes
+        if getattr(self, "_identity_index", None) is None:
+            self._identity_index = build_song_index(self.library)
+        return self._identity_index
+
     def filter_list(self, text):
         t = text.lower().strip()
         if not t:
             self.populate_list(self.queue)
+            return
+
+        rows = search_songs(t)
+        if rows is not None:
+            index = self._library_by_identity()
+            filtered, seen = [], set()
+            for row in rows:
+                song = resolve_song(index, row)
+                if song is not None and id(song) not in seen:
+                    seen.add(id(song))
+                    filtered.append(song)
+            self.populate_list(filtered)
         else:
             filtered = [
                 s for s in self.library
-                if t in s["title"].lower() or t in s["artist"].lower() or t in s["mapper"].lower()
+                if t in s["title"].lower() or t in s["artist"].lower()
+                or any(t in (m.get("mapper") or "").lower() for m in s.get("maps") or [s])
             ]
             self.populate_list(filtered)
 
@@ -0,0 +1,67 @@
+import pytest
+from osuRadio import db
+from osuRadio.merge import merge_library
+
+def song(title, artist, folder, audio, **extra):
+    return {
+        "title": title, "artist": artist, "mapper": extra.pop("mapper", "mapper"),
+        "audio": audio, "background": "", "length": 1000, "osu_file": f"{title} [{extra.get('version', 'Normal')}].osu",
+        "folder": str(folder), **extra,
+    }
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    store = db.LibraryStore(tmp_path / "songs.db")
+    monkeypatch.setattr(db, "library_store", store)
+    db.init_db()
+
+    lazer = tmp_path / "lazer"
+    files = lazer / "files"
+    stable = tmp_path / "Songs"
+    custom = tmp_path / "custom_songs"
+    for path, name in [
+        (files, "h1"), (files, "h2"), (files, "h3"),
+        (stable / "a", "audio.mp3"), (stable / "b", "audio.mp3"), (stable / "c", "audio.mp3"),
+        (stable / "d", "audio.mp3"), (stable / "e", "audio.mp3"),
+        (custom / "x", "x.mp3"), (custom / "y", "y.mp3"), (custom / "z", "z.mp3"),
+    ]:
+        path.mkdir(parents=True, exist_ok=True)
+        (path / name).write_bytes(b"audio")
+
+    lazer_songs = [
+        song("Song A", "Artist", files, "audio.mp3", source="lazer", audio_hash="h1"),
+        song("Song B", "Artist", files, "audio.mp3", source="lazer", audio_hash="h2"),
+        song("Tune", "Band", files, "audio.mp3", source="lazer", audio_hash="h3"),
+    ]
+    stable_songs = [
+        # same audio as lazer Song A under another title
+        song("Song A (TV Size)", "Artist", stable / "a", "audio.mp3", audio_hash="h1"),
+        # two difficulties on one audio file
+        song("Two Diffs", "Someone", stable / "b", "audio.mp3", mapper="one", audio_hash="hb", version="Easy"),
+        song("Two Diffs", "Someone", stable / "b", "audio.mp3", mapper="two", audio_hash="hb", version="Hard"),
+        song("Remix", "DJ", stable / "c", "audio.mp3", audio_hash="hc"),
+        # lazer Tune with different casing, in the same cluster as custom Other
+        song("tune ", "band", stable / "d", "audio.mp3", audio_hash="hd"),
+        song("Plain", "Nobody", stable / "e", "audio.mp3"),
+    ]
+    custom_songs = [
+        song("Remix (Extended)", "DJ", custom / "x", "x.mp3", audio_hash="hx"),
+        song(" song b", "ARTIST", custom / "y", "y.mp3", audio_hash="hy"),
+        song("Other", "Band", custom / "z", "z.mp3", audio_hash="hz"),
+    ]
+    db.save_cache(lazer, lazer_songs, source="lazer").result()
+    db.save_cache(stable, stable_songs).result()
+    db.save_cache(custom, custom_songs, source="custom").result()
+    db.store_dup_clusters([], [
+        (1, str(stable / "c"), "audio.mp3"), (1, str(custom / "x"), "x.mp3"),
+        (2, str(stable / "d"), "audio.mp3"), (2, str(custom / "z"), "z.mp3"),
+    ])
+    yield [lazer, stable, custom]
+    store.close()
+
+def test_load_library_matches_merge_library(library):
+    expected = merge_library(*(db.load_cache(folder) for folder in library))
+    assert db.load_library(library) == expected
+    assert {s["title"] for s in expected} == {
+        "Song A", "Song B", "Tune", "Two Diffs", "Remix", "Plain", "Other"
+    }
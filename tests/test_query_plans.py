@@ -0,0 +1,20 @@
+import pytest
+from osuRadio import db
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = db.LibraryStore(tmp_path / "songs.db")
+    monkeypatch.setattr(db, "library_store", store)
+    db.init_db()
+    yield store
+    store.close()
+
+# Every statement db.py registers as hot must reach songs through an index once the
+# migrations have run; only the staged temp.incoming_songs rows may be scanned.
+@pytest.mark.parametrize("name", sorted(db.HOT_STATEMENTS))
+def test_hot_statement_uses_an_index(store, name):
+    sql = db.HOT_STATEMENTS[name]
+    conn = store.connection()
+    db._stage_songs(conn.cursor(), [])
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count("?"))]
+    assert not [step for step in plan if step.startswith("SCAN songs")], plan